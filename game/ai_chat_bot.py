@@ -21,6 +21,7 @@ class AIChatBot:
         self.running = True
         self.latest_game_state = {}
         self.current_mask = None
+        self.latest_hint = None
         self.agent_type = agent_type
         
         if agent_type == "ppo":
@@ -40,8 +41,9 @@ class AIChatBot:
         self.thread.start()
     
     
-    def send_message(self, user_text, game_state, mask = None):
+    def send_message(self, user_text, game_state, mask = None, hint = None):
         self.latest_game_state = game_state
+        self.latest_hint = hint
         self.input_queue.put(user_text)
         if(mask is not None):
             self.current_mask = mask
@@ -127,6 +129,7 @@ class AIChatBot:
                         Current Labyrinth Sector: {self.latest_game_state}
                         Functional Thrusters (Allowed Actions): {self.current_mask}
                         Navigation Computer Suggestion: {self.interface.get_action(self.latest_game_state, self.current_mask)}
+                        Route Planner (exact search): {self.latest_hint}
 
                         ### NAV-COMPUTER KEY
                         0:Right, 1:Up, 2:Left, 3:Down, 4:Backtrack, 5-8:Buttons 1-4
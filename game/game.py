@@ -15,6 +15,7 @@ from fastapi.request import play_scotty_voice
 
 # Add parent directory for env import
 from gymnasium_env.envs.lab_env import LabEnv
+from gymnasium_env.solver import HEURISTICS, anytime_search, env_state
 
 mapping = {
     pygame.K_RIGHT:0,
@@ -28,6 +29,38 @@ mapping = {
     pygame.K_4:8,
 }
 
+ACTION_NAMES = ["Right", "Up", "Left", "Down", "Backtrack"]
+
+def action_name(action):
+    return ACTION_NAMES[action] if action < len(ACTION_NAMES) else f"Button {action - len(ACTION_NAMES) + 1}"
+
+class HintPlanner:
+    """
+    Route hints from the current state of the game: anytime weighted A* that answers within `budget`
+    seconds with the best plan found so far and whether it is proven shortest.
+    The A* heuristic is built once per episode.
+    """
+    def __init__(self, budget=0.005):
+        self.budget = budget
+        self.space = None
+        self.heuristic = None
+
+    def plan(self, env):
+        space, state = env_state(env)
+        if space is not self.space:
+            self.space, self.heuristic = space, HEURISTICS["room"](space)
+        return anytime_search(space, state, budget=self.budget, heuristic=self.heuristic)
+
+    def hint(self, env):
+        result = self.plan(env)
+        if result.actions is None:
+            return "No route to the exit." if result.optimal else "No route found yet."
+        steps = ", ".join(action_name(action) for action in result.actions[:3])
+        more = ", ..." if len(result.actions) > 3 else ""
+        quality = "shortest route" if result.optimal else "best route found"
+        plural = "" if len(result.actions) == 1 else "s"
+        return f"{steps}{more} ({len(result.actions)} step{plural}, {quality})"
+
 def wrap_text(text, font, max_width):
     words = text.split(' ')
     lines = []
@@ -50,6 +83,7 @@ def wrap_text(text, font, max_width):
 def play_game(agent_type="alphastar"):
     env = LabEnv(number_of_rooms=9 ,render_mode="rgb_array")
     ai_chat = AIChatBot(agent_type=agent_type)
+    hints = HintPlanner()
     observation, info = env.reset()
     ai_chat.reset_agent_state()
     
@@ -89,7 +123,7 @@ def play_game(agent_type="alphastar"):
             if event.key == pygame.K_RETURN:
                 if typing_mode:
                     print(user_text)
-                    ai_chat.send_message(user_text, current_state, env.action_masks())
+                    ai_chat.send_message(user_text, current_state, env.action_masks(), hints.hint(env))
                     user_text = ""
                     typing_mode = False
                 else:
@@ -100,7 +134,9 @@ def play_game(agent_type="alphastar"):
                 else:
                     user_text += event.unicode
             else:
-                if event.key in mapping:
+                if event.key == pygame.K_h:
+                    chat_history.append(f"Planner: {hints.hint(env)}")
+                elif event.key in mapping:
                     current_action = mapping[event.key]
             
                     # ai_chat.update_agent_state(current_state, env.action_masks())
@@ -124,7 +160,7 @@ def play_game(agent_type="alphastar"):
                             running = False
                         #TODO add other commands
                 else:
-                    ai_chat.send_message(transcribed_text, current_state, env.action_masks())
+                    ai_chat.send_message(transcribed_text, current_state, env.action_masks(), hints.hint(env))
         
         
         new_msg = ai_chat.get_new_messages()
@@ -0,0 +1,66 @@
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+
+class SharedMaskHandle:
+    # Picklable reference to row `index` of a (num_envs, actions) int8 mask array in shared memory
+    def __init__(self, name, shape, index):
+        self.name = name
+        self.shape = shape
+        self.index = index
+        self._shm = None
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "index": self.index, "_shm": None}
+
+    def attach(self):
+        if self._shm is None:
+            # Workers share the creator's resource tracker, the segment is unlinked by SharedActionMasks.close
+            self._shm = SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=np.int8, buffer=self._shm.buf)[self.index]
+
+
+class SharedActionMasks:
+    """
+    (num_envs, actions) int8 array that every LabEnv of a vec env keeps its action mask in (see
+    LabEnv.set_mask_buffer). Envs update their row on reset/step, including autoresets, so the masks of
+    all envs are one array read. Uses shared memory when the envs live in worker processes.
+    """
+
+    def __init__(self, num_envs, number_of_actions, shared_memory=False):
+        shape = (num_envs, number_of_actions)
+        self._shm = None
+        if shared_memory:
+            self._shm = SharedMemory(create=True, size=num_envs * number_of_actions)
+            self.array = np.ndarray(shape, dtype=np.int8, buffer=self._shm.buf)
+            self.array[:] = 0
+        else:
+            self.array = np.zeros(shape, dtype=np.int8)
+
+    def row(self, index):
+        if self._shm is None:
+            return self.array[index]
+        return SharedMaskHandle(self._shm.name, self.array.shape, index)
+
+    def close(self):
+        if self._shm is not None:
+            self.array = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def share_action_masks(vec_env):
+    """
+    Connects the LabEnvs of an SB3 vec env (DummyVecEnv or SubprocVecEnv, possibly wrapped) to one
+    SharedActionMasks and exposes its array as vec_env.action_mask_array, which get_action_masks of the
+    recurrent maskable PPO reads instead of calling action_masks() on every env.
+    Call it right after creating the vec env. Returns the SharedActionMasks (close() it after training).
+    """
+    inner = vec_env.unwrapped if hasattr(vec_env, "unwrapped") else vec_env
+    masks = SharedActionMasks(vec_env.num_envs, vec_env.action_space.n, shared_memory=isinstance(inner, SubprocVecEnv))
+    for i in range(vec_env.num_envs):
+        vec_env.env_method("set_mask_buffer", masks.row(i), indices=[i])
+    vec_env.action_mask_array = masks.array
+    return masks
@@ -0,0 +1,261 @@
+import json
+import os
+import shutil
+import multiprocessing as mp
+import numpy as np
+from gymnasium import spaces
+
+from .lab_env import LabEnv
+from .lab_env_cnn import LabEnvCNN
+from .maze_dataset import DEFAULT_DATASET_DIR, HEADER_FILE, MANIFEST_FILE, _write_json
+from .seed_sampler import TRAIN_SEEDS
+from gymnasium_env.solver.search import env_state, solve
+from gymnasium_env.solver.solution_cache import DEFAULT_CACHE_PATH, SolutionCache
+
+DEMO_FORMAT_VERSION = 1
+
+
+def demos_path(num_rooms, base_dir=None, cnn=False):
+    return os.path.join(base_dir or DEFAULT_DATASET_DIR, f"demos_{'cnn_' if cnn else ''}{num_rooms}")
+
+
+def demo_seeds(count, seed=0):
+    # `count` training seeds in a fixed random order: a larger count keeps the smaller one as a prefix (top-ups)
+    return TRAIN_SEEDS.start + np.random.default_rng(seed).permutation(len(TRAIN_SEEDS))[:count]
+
+
+def chunk_name(chunk_id):
+    return f"chunk_{chunk_id:05d}"
+
+
+def obs_columns(observation_space):
+    """
+    (observation key, column name, dtype) of every observation array, key None for a Box observation.
+    Integer observations whose bounds fit are stored as int8.
+    """
+    items = observation_space.spaces.items() if isinstance(observation_space, spaces.Dict) else [(None, observation_space)]
+    columns = []
+    for key, space in items:
+        dtype = space.dtype
+        if np.issubdtype(dtype, np.integer) and space.low.min() >= -128 and space.high.max() <= 127:
+            dtype = np.dtype(np.int8)
+        columns.append((key, "obs" if key is None else f"obs_{key}", dtype))
+    return columns
+
+
+def flatten_observations(observations, observation_space):
+    """
+    Rows of `observations` (an episode of DemoDataset.episode, or concatenated episodes) flattened the
+    way FlattenObservation flattens observation_space: every Box in order, cast to the flat dtype.
+    """
+    dtype = spaces.flatten_space(observation_space).dtype
+    if not isinstance(observation_space, spaces.Dict):
+        return np.asarray(observations, dtype=dtype).reshape(len(observations), -1)
+    rows = len(next(iter(observations.values())))
+    return np.concatenate([np.asarray(observations[key], dtype=dtype).reshape(rows, -1) for key in observation_space.spaces], axis=1)
+
+
+def make_demo_env(number_of_rooms, env_kwargs=None, cnn=False):
+    env_class = LabEnvCNN if cnn else LabEnv
+    return env_class(number_of_rooms=number_of_rooms, **(env_kwargs or {}))
+
+
+def generate_demo_chunk(args):
+    """
+    Solves and replays the labs of `seeds` in one env and writes them as one chunk to `chunk_dir`.
+    Runs inside a pool worker: only the chunk header goes back to the parent.
+    Columns (one row per step): the observation before the action, the action and the action mask;
+    episode_offsets[e]:episode_offsets[e + 1] are the rows of episode e, seeds[e] its lab seed.
+    Unsolvable labs are left out.
+    """
+    chunk_dir, seeds, config, cache_path = args
+    env = make_demo_env(config["number_of_rooms"], config["env_kwargs"], config["cnn"])
+    cache = SolutionCache(cache_path) if cache_path else None
+    columns = obs_columns(env.observation_space)
+
+    observations = {name: [] for _, name, _ in columns}
+    actions, masks, offsets, episode_seeds = [], [], [0], []
+    for seed in seeds:
+        obs, info = env.reset(options={"lab_seed": int(seed)})
+        if cache is not None:
+            plan = cache.solve_env(env)
+        else:
+            space, state = env_state(env)
+            plan = solve(space, start_state=state)
+        if not plan:
+            continue
+        for action in plan:
+            for key, name, dtype in columns:
+                # Copies, obs_buffers envs reuse their observation arrays
+                observations[name].append(np.array(obs if key is None else obs[key], dtype=dtype))
+            masks.append(info["action_mask"])
+            obs, _, terminated, truncated, info = env.step(action)
+            actions.append(action)
+            if terminated or truncated:
+                break
+        offsets.append(len(actions))
+        episode_seeds.append(int(seed))
+    if cache is not None:
+        cache.close()
+    env.close()
+
+    arrays = {
+        "seeds": np.array(episode_seeds, dtype=np.int64),
+        "episode_offsets": np.array(offsets, dtype=np.int64),
+        "actions": np.array(actions, dtype=np.uint8),
+        "action_masks": np.array(masks, dtype=np.int8).reshape(len(actions), env.action_space.n),
+    }
+    for key, name, dtype in columns:
+        shape = env.observation_space.shape if key is None else env.observation_space[key].shape
+        arrays[name] = np.array(observations[name], dtype=dtype).reshape((len(actions),) + shape)
+    return DemoDataset.write_chunk(chunk_dir, arrays, config, [key for key, _, _ in columns])
+
+
+class DemoDataset:
+    """
+    Expert demonstrations as flat columns (one row per step) with episode offsets, stored like a
+    MazeDataset: one .npy file per column and a header.json per chunk, and a manifest.json listing the
+    chunks. Columns are opened with mmap_mode="r", so BC training reads episodes straight from the
+    page cache instead of holding Python lists of observation dicts. Build or top up with build_demos.
+    """
+
+    def __init__(self, manifest, path):
+        self.manifest = manifest
+        self.path = path
+        self.config = manifest["config"]
+        self.columns = manifest["columns"]
+        self.observation_keys = manifest["observation_keys"]
+        self.chunk_names = [chunk["path"] for chunk in manifest["chunks"]]
+        # Global episode index of the first episode of every chunk
+        self.chunk_offsets = np.cumsum([0] + [chunk["episodes"] for chunk in manifest["chunks"]])
+        self.num_steps = manifest["steps"]
+        self._chunk_arrays = [None] * len(self.chunk_names)
+
+    def __len__(self):
+        return int(self.chunk_offsets[-1])
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != DEMO_FORMAT_VERSION:
+            raise ValueError(f"Unsupported demo format {manifest.get('format_version')} in {path}")
+        return cls(manifest, path)
+
+    def _chunk(self, chunk_id):
+        arrays = self._chunk_arrays[chunk_id]
+        if arrays is None:
+            chunk_dir = os.path.join(self.path, self.chunk_names[chunk_id])
+            arrays = {name: np.load(os.path.join(chunk_dir, f"{name}.npy"), mmap_mode="r") for name in self.columns}
+            self._chunk_arrays[chunk_id] = arrays
+        return arrays
+
+    def episode(self, idx):
+        """
+        (observations, actions, action_masks) of episode `idx` as memory-mapped views, observations
+        as a dict by observation key (an array for Box observations).
+        """
+        chunk_id = int(np.searchsorted(self.chunk_offsets, idx, side="right")) - 1
+        arrays = self._chunk(chunk_id)
+        local = idx - self.chunk_offsets[chunk_id]
+        start, stop = arrays["episode_offsets"][local], arrays["episode_offsets"][local + 1]
+        observations = {key: arrays[f"obs_{key}"][start:stop] for key in self.observation_keys if key is not None}
+        if None in self.observation_keys:
+            observations = arrays["obs"][start:stop]
+        return observations, arrays["actions"][start:stop], arrays["action_masks"][start:stop]
+
+    def seeds(self):
+        # Lab seed of every episode
+        seeds = [self._chunk(chunk_id)["seeds"] for chunk_id in range(len(self.chunk_names))]
+        return np.concatenate(seeds) if seeds else np.array([], dtype=np.int64)
+
+    @staticmethod
+    def write_chunk(chunk_dir, arrays, config, observation_keys):
+        os.makedirs(chunk_dir, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(os.path.join(chunk_dir, f"{name}.npy"), values)
+        header = {
+            "format_version": DEMO_FORMAT_VERSION,
+            "config": config,
+            "episodes": len(arrays["seeds"]),
+            "steps": len(arrays["actions"]),
+            "observation_keys": observation_keys,
+            "columns": {name: {"dtype": values.dtype.name, "shape": list(values.shape[1:])} for name, values in arrays.items()},
+        }
+        # Header is written last so an interrupted write is never picked up as a valid chunk
+        _write_json(os.path.join(chunk_dir, HEADER_FILE), header)
+        return header
+
+    @staticmethod
+    def read_chunk_header(chunk_dir):
+        # Header of a completely written chunk, None if it is missing or unfinished
+        header_path = os.path.join(chunk_dir, HEADER_FILE)
+        if not os.path.exists(header_path):
+            return None
+        with open(header_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_manifest(path, chunk_names):
+        headers = [DemoDataset.read_chunk_header(os.path.join(path, name)) for name in chunk_names]
+        manifest = {
+            "format_version": DEMO_FORMAT_VERSION,
+            "config": headers[0]["config"] if headers else None,
+            "observation_keys": headers[0]["observation_keys"] if headers else [],
+            "columns": list(headers[0]["columns"]) if headers else [],
+            "steps": sum(header["steps"] for header in headers),
+            "chunks": [{"path": name, "episodes": header["episodes"]} for name, header in zip(chunk_names, headers)],
+        }
+        _write_json(os.path.join(path, MANIFEST_FILE), manifest)
+        return manifest
+
+
+def build_demos(path, seeds, number_of_rooms=9, env_kwargs=None, cnn=False, workers=None, chunk_size=2000,
+                cache_path=DEFAULT_CACHE_PATH):
+    """
+    Generates the demonstrations of `seeds` into `path` with a process pool, `chunk_size` seeds per chunk,
+    each worker solving (through the solution cache, None to disable it), replaying and writing its chunk.
+    Incremental: seeds already in complete chunks are skipped, so a larger seed list tops the demos up and
+    an interrupted build resumes. Returns the DemoDataset.
+    """
+    config = {"number_of_rooms": int(number_of_rooms), "env_kwargs": env_kwargs or {}, "cnn": bool(cnn)}
+    os.makedirs(path, exist_ok=True)
+
+    complete, covered = [], []
+    for name in sorted(os.listdir(path)):
+        chunk_dir = os.path.join(path, name)
+        if not name.startswith("chunk_") or not os.path.isdir(chunk_dir):
+            continue
+        header = DemoDataset.read_chunk_header(chunk_dir)
+        if header is None:
+            # Left by an interrupted build
+            shutil.rmtree(chunk_dir)
+            continue
+        if header["config"] != config:
+            raise ValueError(f"Demos in {path} were built with {header['config']}, not {config}")
+        complete.append(name)
+        covered.append(np.load(os.path.join(chunk_dir, "seeds.npy")))
+    # Unsolvable seeds are not stored, they are solved again (from the cache) by every top-up
+    seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+    if covered:
+        seeds = np.setdiff1d(seeds, np.concatenate(covered))
+
+    next_id = int(complete[-1][len("chunk_"):]) + 1 if complete else 0
+    tasks = [
+        (os.path.join(path, chunk_name(next_id + i)), seeds[start:start + chunk_size], config, cache_path)
+        for i, start in enumerate(range(0, len(seeds), chunk_size))
+    ]
+    print(f"[Demos] {len(seeds)} new seeds in {len(tasks)} chunks ({len(complete)} chunks already built)")
+    if tasks:
+        workers = min(workers or mp.cpu_count(), len(tasks))
+        if workers == 1:
+            for task in tasks:
+                generate_demo_chunk(task)
+        else:
+            with mp.Pool(workers) as pool:
+                for _ in pool.imap_unordered(generate_demo_chunk, tasks):
+                    pass
+        complete += [os.path.basename(task[0]) for task in tasks]
+
+    DemoDataset.write_manifest(path, complete)
+    return DemoDataset.load(path)
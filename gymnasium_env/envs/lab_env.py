@@ -2,31 +2,68 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import pygame
+from collections import deque, namedtuple
 from .lab_generator import LabGenerator
+from .maze_dataset import MazeDataset
+from .seed_sampler import make_seed_sampler
+from .lab_prefetcher import LabPrefetcher
+from gymnasium_env.solver.oracle import compute_oracle_batch, compute_oracle_edges, last_direction
+from gymnasium_env.solver.state_space import LabStateSpace
+
+# Immutable snapshot of the dynamic state of an episode (see LabEnv.get_state), hashable for planners
+LabState = namedtuple("LabState", ["agent_room", "last_room", "button_mask", "steps"])
 
 class LabEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
 
-    def __init__(self, render_mode=None, number_of_rooms=4, valid_seeds=None, max_rooms=None):
-        self.valid_seeds = valid_seeds
+    def __init__(self, render_mode=None, number_of_rooms=4, valid_seeds=None, max_rooms=None, state_mode="dense",
+                 difficulty=None, difficulty_weights=None, augment=False, number_of_buttons=4, obs_buffers=False,
+                 prefetch=0, prefetch_workers=0):
+        # state_mode "dense": doors live in lab.door_state_matrix (default)
+        # state_mode "bitset": doors live in lab.door_bits, one bit per grid edge; dense matrix is built on demand
+        # state_mode "sparse": the lab is a list of grid edges (no rooms x rooms matrices) and observations are
+        #   per edge, for large grids; actions are 5 + number_of_buttons
+        # obs_buffers: observations are int8 arrays in preallocated buffers owned by the env, see _get_obs
+        # prefetch: number of upcoming labs generated in the background for seeds missing from the dataset
+        #   (prefetch_workers=0: one thread, > 0: that many processes), see LabPrefetcher
+        assert state_mode in ("dense", "bitset", "sparse"), f"Unknown state_mode {state_mode}"
+        assert not (augment and state_mode == "sparse"), "augment is not supported in sparse mode"
+        self.state_mode = state_mode
         self.num_rooms = number_of_rooms 
         self.max_rooms = max_rooms if max_rooms is not None else number_of_rooms
         
-        self.lab = LabGenerator(number_of_rooms=self.num_rooms)
+        self.lab = LabGenerator(number_of_rooms=self.num_rooms, number_of_buttons=number_of_buttons,
+                                sparse=state_mode == "sparse")
         self.grid_size = self.lab.grid_size
         self.max_grid_size = int(np.sqrt(self.max_rooms))
         
-        self.action_space = spaces.Discrete(5 + self.max_rooms)
+        if state_mode == "sparse":
+            self.action_space = spaces.Discrete(5 + self.lab.number_of_buttons)
+        else:
+            self.action_space = spaces.Discrete(5 + self.max_rooms)
+        # Action mask of the current state, updated by reset/step (see action_masks / set_mask_buffer)
+        self.action_mask = np.zeros(self.action_space.n, dtype=np.int8)
         
         # Observations
-        self.observation_space = spaces.Dict({
-            "agent_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
-            "goal_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
-            "door_states": spaces.Box(0, 1, shape=(self.num_rooms, self.num_rooms), dtype=int),
-            "button_locations": spaces.Box(0, 1, shape=(self.num_rooms, self.lab.number_of_buttons), dtype=int),
-            "last_pos": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
-            "button_door_behavior": spaces.Box(0, 1, shape=(self.lab.number_of_buttons, self.num_rooms, self.num_rooms), dtype=int),
-        })
+        if state_mode == "sparse":
+            self.observation_space = self._sparse_observation_space()
+        else:
+            self.observation_space = spaces.Dict({
+                "agent_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+                "goal_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+                "door_states": spaces.Box(0, 1, shape=(self.num_rooms, self.num_rooms), dtype=int),
+                "button_locations": spaces.Box(0, 1, shape=(self.num_rooms, self.lab.number_of_buttons), dtype=int),
+                "last_pos": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+                "button_door_behavior": spaces.Box(0, 1, shape=(self.lab.number_of_buttons, self.num_rooms, self.num_rooms), dtype=int),
+            })
+        self.obs_buffers = obs_buffers
+        self._obs = None
+        if obs_buffers:
+            assert self.max_grid_size <= 128, "obs_buffers stores coordinates as int8"
+            self.observation_space = spaces.Dict({
+                key: spaces.Box(space.low.astype(np.int8), space.high.astype(np.int8), dtype=np.int8)
+                for key, space in self.observation_space.spaces.items()
+            })
         # self.observation_space = spaces.Dict({
         #     # Coordinates (using MultiDiscrete for X,Y pairs)
         #     "agent_location": spaces.MultiDiscrete([self.grid_size, self.grid_size]),
@@ -49,6 +86,22 @@ class LabEnv(gym.Env):
         agent_r, agent_c = self.lab.index_to_coord(self.lab.start_room)
         self.agent_location = np.array([agent_r, agent_c])
         self.steps = 0
+        self._doors_dirty = False
+        self._obs_doors_dirty = False
+        # Toggled buttons since reset (bit b = button b pressed an odd number of times), used by the oracle
+        self.button_mask = 0
+        # Seed and dataset row (-1 if generated) of the current lab
+        self.lab_seed = None
+        self.lab_index = -1
+        self._oracle = None
+        # augment: every episode plays the lab under a random grid symmetry and button order,
+        # self.augmentation = (symmetry, button_order) of the current episode
+        self.augment = augment
+        self.augmentation = (0, np.arange(self.lab.number_of_buttons))
+        
+        self._start_doors = None
+        self._start_door_bits = 0
+        self._state_space = None
         
         # Rendering
         self.window = None
@@ -60,78 +113,177 @@ class LabEnv(gym.Env):
         self.reward_goal = 10.0
         self.reward_invalid = -0.5
         
-        # seeds
-        self.train_seeds = list(range(0, 1000000))
-        self.eval_seeds = list(range(10000000, 10001000))
-        
-        if valid_seeds == "train":
-            self.valid_seeds = self.train_seeds
-        elif valid_seeds == "eval":
-            self.valid_seeds = self.eval_seeds
-        else:
-            self.valid_seeds = None
-            
-        # Hook up caching framework
-        self.precalc_data = None
-        self.precalc_seeds_map = {}
-        self._load_precalc_data()
+        # seeds ("train", "eval", a range/array, (seeds, weights) or any SeedSampler)
+        self.valid_seeds = valid_seeds
+        # difficulty filter/weighting, sampled from the dataset's difficulty buckets (see MazeDataset.difficulty_sampler)
+        self.difficulty = difficulty
+        self.difficulty_weights = difficulty_weights
             
-    def _load_precalc_data(self):
-        import os
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        dataset_path = os.path.join(base_dir, "..", "..", "datasets", f"mazes_{self.num_rooms}.npz")
+        # Seeds already drawn for the next episodes, their labs are generated ahead by the prefetcher
+        self.prefetch = prefetch
+        self.prefetcher = LabPrefetcher(capacity=prefetch, workers=prefetch_workers) if prefetch > 0 else None
         
-        if os.path.exists(dataset_path):
-            try:
-                data = np.load(dataset_path)
-                # Parse all arrays into direct memory 
-                self.precalc_data = {k: v for k, v in data.items()}
-                # Create extremely fast seed-to-index lookup mapping
-                self.precalc_seeds_map = {seed: idx for idx, seed in enumerate(self.precalc_data["seeds"])}
-            except Exception as e:
-                print(f"[LabEnv] Failed to parse dataset {dataset_path}: {e}")
-                self.precalc_data = None
-        else:
-            self.precalc_data = None
+        # Per room count: generator, dataset, seed sampler, upcoming seeds and observation buffers (see _use_size),
+        # stage_mix = (room counts, probabilities) when every episode draws its size
+        self._sizes = {}
+        self.stage_mix = None
+        self._use_size(number_of_rooms, self.lab)
             
-    def set_curriculum_stage(self, number_of_rooms):
-        if number_of_rooms > self.max_rooms:
-            raise ValueError(f"Curriculum room size {number_of_rooms} exceeds configured max_rooms={self.max_rooms}")
+    def _open_dataset(self, lab):
+        # Memory-mapped dataset of the lab's size (cached per process by MazeDataset.open)
+        if self.state_mode == "sparse":
+            # Datasets store dense labs
+            return None
+        dataset = MazeDataset.open(lab.number_of_rooms)
+        if dataset is not None and dataset.fields["button_location_matrix"]["shape"][-1] != lab.number_of_buttons:
+            print(f"[LabEnv] Dataset for {lab.number_of_rooms} rooms has a different button count, generating labs instead")
+            dataset = None
+        return dataset
+
+    def _use_size(self, number_of_rooms, lab=None):
+        # Switches to labs of `number_of_rooms`, everything per size is built once and kept
+        size = self._sizes.get(number_of_rooms)
+        if size is None:
+            if lab is None:
+                lab = LabGenerator(number_of_rooms=number_of_rooms, number_of_buttons=self.lab.number_of_buttons,
+                                   sparse=self.state_mode == "sparse")
+            size = self._sizes[number_of_rooms] = {
+                "lab": lab, "dataset": self._open_dataset(lab), "seed_sampler": None, "upcoming_seeds": deque(), "obs": None,
+            }
+        if size["seed_sampler"] is None:
+            # Difficulty buckets belong to the dataset of the size
+            size["seed_sampler"] = make_seed_sampler(self.valid_seeds, size["dataset"], self.difficulty, self.difficulty_weights)
+        self._size = size
         self.num_rooms = number_of_rooms
-        self.lab = LabGenerator(number_of_rooms=self.num_rooms)
+        self.lab = size["lab"]
         self.grid_size = self.lab.grid_size
-        self._load_precalc_data()
+        self.dataset = size["dataset"]
+        self.seed_sampler = size["seed_sampler"]
+        self._upcoming_seeds = size["upcoming_seeds"]
+        self._obs = size["obs"]
+
+    def _sparse_observation_space(self):
+        # Compact observation: everything per grid edge instead of per room pair
+        edges, buttons = self.lab.number_of_edges, self.lab.number_of_buttons
+        return spaces.Dict({
+            "agent_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "goal_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "walls": spaces.Box(0, 1, shape=(edges,), dtype=int),
+            "door_states": spaces.Box(0, 1, shape=(edges,), dtype=int),
+            "button_locations": spaces.Box(0, 1, shape=(self.num_rooms, buttons), dtype=int),
+            "last_pos": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "button_door_behavior": spaces.Box(0, 1, shape=(buttons, edges), dtype=int),
+        })
+
+    def set_difficulty(self, difficulty=None, difficulty_weights=None):
+        # Takes effect from the next reset
+        self.difficulty = difficulty
+        self.difficulty_weights = difficulty_weights
+        for size in self._sizes.values():
+            size["seed_sampler"] = None
+        self._clear_upcoming_seeds()
+        self._use_size(self.num_rooms)
+            
+    def set_curriculum_stage(self, number_of_rooms):
+        """
+        Switches the lab size from the next reset. `number_of_rooms` is a room count or a {room count: weight}
+        mix from which every episode draws its size (e.g. {4: 0.3, 9: 0.7}); observation shapes follow the
+        size of the current lab. Generators, datasets and seed samplers are kept per size, so switching
+        back and forth costs nothing after the first use of a size.
+        """
+        mix = number_of_rooms if isinstance(number_of_rooms, dict) else {number_of_rooms: 1.0}
+        for rooms in mix:
+            if rooms > self.max_rooms:
+                raise ValueError(f"Curriculum room size {rooms} exceeds configured max_rooms={self.max_rooms}")
+        rooms = list(mix)
+        if len(rooms) == 1:
+            self.stage_mix = None
+        else:
+            weights = np.array([mix[r] for r in rooms], dtype=np.float64)
+            self.stage_mix = (rooms, weights / weights.sum())
+        if self.prefetcher is not None:
+            # Room for the upcoming labs of every size in the mix
+            self.prefetcher.capacity = self.prefetch * len(rooms)
+        self._use_size(rooms[0])
+
+    def _draw_lab_seed(self):
+        if self.seed_sampler is not None:
+            return self.seed_sampler.sample(self.np_random)
+        return int(self.np_random.integers(0, 2**31 - 1))
+
+    def _next_lab_seed(self):
+        # Without prefetching the seed is drawn at reset, with it `prefetch` seeds are drawn ahead
+        # (same seed sequence unless augment also draws from np_random) and requested from the prefetcher
+        if self.prefetcher is None:
+            return self._draw_lab_seed()
+        while len(self._upcoming_seeds) < self.prefetch:
+            lab_seed = self._draw_lab_seed()
+            self._upcoming_seeds.append(lab_seed)
+            if self.dataset is None or self.dataset.index_of(lab_seed) < 0:
+                self.prefetcher.request(self.num_rooms, self.lab.number_of_buttons, self.lab.sparse, lab_seed)
+        return self._upcoming_seeds.popleft()
+
+    def _clear_upcoming_seeds(self):
+        for size in self._sizes.values():
+            size["upcoming_seeds"].clear()
+        if self.prefetcher is not None:
+            self.prefetcher.clear()
+
+    def prefetch_stats(self):
+        # Hit/wait/miss counts of the prefetcher (see LabPrefetcher.stats), None without prefetching
+        return self.prefetcher.stats() if self.prefetcher is not None else None
         
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)        
+        if seed is not None:
+            # Reseeding restarts the seed sequence
+            self._clear_upcoming_seeds()
+        if self.stage_mix is not None:
+            rooms, probabilities = self.stage_mix
+            self._use_size(rooms[int(self.np_random.choice(len(rooms), p=probabilities))])
         
-        if self.valid_seeds is not None:
-            lab_seed = int(self.np_random.choice(self.valid_seeds))
-        else:
-            lab_seed = int(self.np_random.integers(0, 2**31 - 1))
+        # options={"lab_seed": s} plays the lab of seed s (e.g. to replay or solve a fixed seed list)
+        lab_seed = options.get("lab_seed") if options else None
+        if lab_seed is None:
+            lab_seed = self._next_lab_seed()
+        self.lab_seed = lab_seed
             
-        # Hook into RAM dataset arrays to skip physical maze generation completely
-        if self.precalc_data is not None and lab_seed in self.precalc_seeds_map:
-            idx = self.precalc_seeds_map[lab_seed]
-            self.lab.start_room = self.precalc_data["start_room"][idx]
-            self.lab.goal_room = self.precalc_data["goal_room"][idx]
-            self.lab.room_trans_matrix = self.precalc_data["room_trans_matrix"][idx]
-            self.lab.door_state_matrix = self.precalc_data["door_state_matrix"][idx]
-            self.lab.button_location_matrix = self.precalc_data["button_location_matrix"][idx]
-            self.lab.button2door_behavior_matrix = self.precalc_data["button2door_behavior_matrix"][idx]
-        else:
+        # Hook into the memory-mapped dataset to skip physical maze generation completely
+        idx = self.dataset.index_of(lab_seed) if self.dataset is not None else -1
+        self.lab_index = idx
+        self._oracle = None
+        self._state_space = None
+        if idx >= 0:
+            self.dataset.load_into(self.lab, idx)
+        elif self.prefetcher is None or not self.prefetcher.load_into(self.lab, lab_seed):
             self.lab.generate_lab(seed=lab_seed)        
             
+        if self.augment:
+            symmetry = int(self.np_random.integers(0, len(self.lab.symmetries)))
+            button_order = self.np_random.permutation(self.lab.number_of_buttons)
+            self.lab.apply_symmetry(symmetry, button_order)
+            self.augmentation = (symmetry, button_order)
+            
+        if self.state_mode == "bitset":
+            self.lab.encode_bitsets()
+            self._doors_dirty = False
+        # Doors at the start of the episode, the oracle is indexed by toggles relative to them
+        self._start_doors = self.lab.door_edges if self.state_mode == "sparse" else self.lab.door_state_matrix
+        self._start_door_bits = self.lab.door_bits
+            
         start_idx = self.lab.start_room
-        agent_r, agent_c = self.lab.index_to_coord(start_idx)
-        self.agent_location = np.array([agent_r, agent_c])
+        self.agent_location = self.lab.topology.coords[start_idx].copy()
         self.last_pos = self.agent_location
         self.steps = 0
+        self.button_mask = 0
+        if self.obs_buffers:
+            self._fill_obs_buffers()
+        self._update_action_mask()
         
         if self.render_mode == "human":
             self.render()
             
-        return self._get_obs(), {}
+        return self._get_obs(), {"action_mask": self.action_mask.copy()}
 
     def step(self, action):
         reward = self.reward_step
@@ -142,32 +294,30 @@ class LabEnv(gym.Env):
             truncated = True
             
         
+        topology = self.lab.topology
         current_r, current_c = self.agent_location
-        current_idx = self.lab.coord_to_index(current_r, current_c)
+        current_idx = topology.coord_to_index(current_r, current_c)
         
         if action < 5: # Move
-            # Calc new pos
-            new_r, new_c = current_r, current_c
-            if action == 0: new_c += 1 # Right
-            elif action == 1: new_r -= 1 # Up
-            elif action == 2: new_c -= 1 # Left
-            elif action == 3: new_r += 1 # Down
-            elif action == 4: # Backtrack
-                if self.last_pos[0] != -1: # Only valid if last_pos is set
-                    new_r, new_c = self.last_pos
+            # Neighbour in the move direction (-1 outside the grid), Backtrack returns to last_pos
+            if action < 4:
+                target_idx = topology.neighbors[current_idx, action]
+            elif self.last_pos[0] != -1: # Only valid if last_pos is set
+                target_idx = topology.coord_to_index(*self.last_pos)
+            else:
+                target_idx = current_idx
             
             # Check bounds
-            if 0 <= new_r < self.grid_size and 0 <= new_c < self.grid_size:
-                target_idx = self.lab.coord_to_index(new_r, new_c)
-                
+            if target_idx >= 0:
                 # Check if door connects and is open (unless backtracking)
-                is_open = self.lab.door_state_matrix[current_idx, target_idx] == 1
+                is_open = self._is_door_open(current_idx, target_idx)
                 is_backtrack = (action == 4)
                 
                 if is_open or is_backtrack:
                     # Move successful
                     self.last_pos = self.agent_location.copy()
-                    self.agent_location = np.array([new_r, new_c])
+                    self.agent_location = topology.coords[target_idx].copy()
+                    self._update_action_mask()
                     
                     # Check Goal
                     if target_idx == self.lab.goal_room:
@@ -182,17 +332,28 @@ class LabEnv(gym.Env):
             # Check if button exists in current room
             if btn_idx < self.lab.number_of_buttons:
                 if self.lab.button_location_matrix[current_idx, btn_idx] == 1:
-                    # Toggle doors
-                    behavior = self.lab.button2door_behavior_matrix[btn_idx]
-                    
-                    # XOR current states with behavior
-                    current_states = self.lab.door_state_matrix
-                    new_states = np.logical_xor(current_states, behavior).astype(int)
-                    
-                    # Enforce Walls stay Walls (TransMatrix == 0 -> State = 0)
-                    new_states = new_states * self.lab.room_trans_matrix
-                    
-                    self.lab.door_state_matrix = new_states
+                    self.button_mask ^= 1 << btn_idx
+                    self._obs_doors_dirty = True
+                    if self.state_mode == "bitset":
+                        # Toggle doors with a single XOR, walls stay walls
+                        self.lab.door_bits = (self.lab.door_bits ^ self.lab.button_bits[btn_idx]) & self.lab.trans_bits
+                        self._doors_dirty = True
+                    elif self.state_mode == "sparse":
+                        self.lab.door_edges = (self.lab.door_edges ^ self.lab.button_edges[btn_idx]) & self.lab.room_trans_edges
+                    else:
+                        # Toggle doors
+                        behavior = self.lab.button2door_behavior_matrix[btn_idx]
+                        
+                        # XOR current states with behavior
+                        current_states = self.lab.door_state_matrix
+                        new_states = np.logical_xor(current_states, behavior).astype(int)
+                        
+                        # Enforce Walls stay Walls (TransMatrix == 0 -> State = 0)
+                        new_states = new_states * self.lab.room_trans_matrix
+                        
+                        self.lab.door_state_matrix = new_states
+                    # Same room, only the doors changed
+                    self._update_action_mask(moved=False)
                 else:
                     # Button not in current room
                     reward = self.reward_invalid
@@ -203,15 +364,206 @@ class LabEnv(gym.Env):
         if self.render_mode == "human":
             self.render()
 
-        return self._get_obs(), reward, terminated, truncated, {}
+        return self._get_obs(), reward, terminated, truncated, {"action_mask": self.action_mask.copy()}
+
+    def get_oracle(self):
+        """
+        Exact optimal value of the current state: (distance_to_goal, optimal_action_mask).
+        Distance UNREACHABLE (255) means the goal can no longer be reached; bit a of the mask is set
+        if action a is optimal. Read from the dataset tables when the lab came from a dataset with an
+        oracle, otherwise computed once per episode.
+        """
+        if self._oracle is None:
+            # Dataset tables describe the untransformed lab
+            if self.lab_index >= 0 and self.dataset.has_oracle and not self.augment:
+                self._oracle = (self.dataset.get("oracle_distance", self.lab_index), self.dataset.get("oracle_actions", self.lab_index))
+            elif self.state_mode == "sparse":
+                # Straight from the edge arrays, the lab's dense matrices are left alone
+                self._oracle = compute_oracle_edges(
+                    self.lab.goal_room, self.lab.neighbor_edges, self.lab.room_trans_edges, self._start_doors,
+                    self.lab.button_location_matrix, self.lab.button_edges,
+                )
+            else:
+                self._oracle = tuple(table[0] for table in compute_oracle_batch(
+                    [self.lab.goal_room], self.lab.room_trans_matrix, self._start_doors,
+                    self.lab.button_location_matrix, self.lab.button2door_behavior_matrix,
+                ))
+        distance, optimal_actions = self._oracle
+        current_idx = self.lab.coord_to_index(*self.agent_location)
+        last_idx = self.lab.coord_to_index(*self.last_pos)
+        last_slot = last_direction(current_idx, last_idx, self.grid_size)
+        return int(distance[current_idx, self.button_mask, last_slot]), int(optimal_actions[current_idx, self.button_mask, last_slot])
+
+    def get_state(self):
+        """
+        Snapshot of the episode as a LabState. The doors are fully determined by button_mask (buttons
+        pressed an odd number of times since reset), so the snapshot is four ints and never copies the lab.
+        """
+        topology = self.lab.topology
+        return LabState(int(topology.coord_to_index(*self.agent_location)), int(topology.coord_to_index(*self.last_pos)),
+                        self.button_mask, self.steps)
+
+    def set_state(self, state):
+        # Restores a LabState of the current episode (from get_state or simulate), returns its observation
+        topology = self.lab.topology
+        self.agent_location = topology.coords[state.agent_room].copy()
+        self.last_pos = topology.coords[state.last_room].copy()
+        self.steps = state.steps
+        if state.button_mask != self.button_mask:
+            self.button_mask = state.button_mask
+            self._restore_doors()
+            self._obs_doors_dirty = True
+        self._update_action_mask()
+        return self._get_obs()
+
+    def _restore_doors(self):
+        # Doors at reset with every button of button_mask toggled, walls stay walls
+        toggled = [btn_idx for btn_idx in range(self.lab.number_of_buttons) if (self.button_mask >> btn_idx) & 1]
+        if self.state_mode == "bitset":
+            door_bits = self._start_door_bits
+            for btn_idx in toggled:
+                door_bits ^= self.lab.button_bits[btn_idx]
+            self.lab.door_bits = door_bits & self.lab.trans_bits
+            self._doors_dirty = True
+        elif self.state_mode == "sparse":
+            door_edges = self._start_doors
+            for btn_idx in toggled:
+                door_edges = door_edges ^ self.lab.button_edges[btn_idx]
+            self.lab.door_edges = door_edges & self.lab.room_trans_edges if toggled else door_edges
+        else:
+            door_states = self._start_doors
+            for btn_idx in toggled:
+                door_states = np.logical_xor(door_states, self.lab.button2door_behavior_matrix[btn_idx]).astype(int)
+            self.lab.door_state_matrix = door_states * self.lab.room_trans_matrix if toggled else door_states
+
+    def state_space(self):
+        # LabStateSpace of the current episode (doors at reset), built on first use
+        if self._state_space is None:
+            if self.state_mode == "sparse":
+                self._state_space = LabStateSpace.from_edges(self.lab, door_edges=self._start_doors)
+            else:
+                self._state_space = LabStateSpace(self.lab.start_room, self.lab.goal_room, self.lab.room_trans_matrix,
+                                                  self._start_doors, self.lab.button_location_matrix,
+                                                  self.lab.button2door_behavior_matrix)
+        return self._state_space
+
+    def simulate(self, state, action):
+        """
+        Pure transition of the current lab: (LabState, action) -> (next LabState, reward, done) with the
+        rewards, termination and truncation of step. Leaves the env untouched, so a planner can expand
+        many nodes from one env and only set_state the one it commits to.
+        """
+        space = self.state_space()
+        room, last, mask, steps = state
+        steps += 1
+        reward = self.reward_step
+        terminated = False
+        
+        if action < 5: # Move
+            target = int(self.lab.topology.neighbors[room, action]) if action < 4 else last
+            if target >= 0:
+                # Backtracking ignores doors, open_bits holds the open doors of every button mask
+                if action == 4 or (space.open_bits[room * space.num_masks + mask] >> target) & 1:
+                    room, last = target, room
+                    if room == space.goal_room:
+                        terminated = True
+                        reward = self.reward_goal
+                else:
+                    reward = self.reward_invalid
+        else: # Button
+            btn_idx = action - 5
+            if btn_idx < space.number_of_buttons:
+                if btn_idx in space.buttons_in_room[room]:
+                    mask ^= 1 << btn_idx
+                else:
+                    reward = self.reward_invalid
+            else:
+                reward = -2
+        return LabState(room, last, mask, steps), reward, terminated or steps > 100
+
+    def original_action(self, action):
+        # Action in the untransformed lab that corresponds to `action` in the augmented one
+        symmetry, button_order = self.augmentation
+        if action < 4:
+            return int(np.flatnonzero(self.lab.symmetry_directions[symmetry] == action)[0])
+        if action >= 5 and action - 5 < len(button_order):
+            return 5 + int(button_order[action - 5])
+        return action
+
+    def _is_door_open(self, current_idx, target_idx):
+        if self.state_mode == "sparse":
+            edge = self.lab.edge_between(current_idx, target_idx)
+            return edge >= 0 and self.lab.door_edges[edge] == 1
+        if self.state_mode == "bitset":
+            edge = self.lab.edge_index[current_idx, target_idx]
+            return edge >= 0 and (self.lab.door_bits >> int(edge)) & 1 == 1
+        return self.lab.door_state_matrix[current_idx, target_idx] == 1
+
+    def _door_states(self):
+        # Dense door matrix, decoded from the bitset only when doors changed since the last call
+        if self.state_mode == "sparse":
+            # Rendering only, O(rooms^2)
+            self.lab.to_dense()
+            return self.lab.door_state_matrix
+        if self.state_mode == "bitset" and self._doors_dirty:
+            self.lab.door_state_matrix = self.lab.unpack_edges(self.lab.door_bits)
+            self._doors_dirty = False
+        return self.lab.door_state_matrix
+
+    def _fill_obs_buffers(self):
+        """
+        (Re)fills the observation buffers at reset: the lab layout, buttons and goal are written once
+        per episode, step only rewrites agent_location, last_pos and (after a button press) door_states.
+        Buffers are reallocated only when the lab size changes (curriculum stages).
+        """
+        sparse = self.state_mode == "sparse"
+        static = {
+            "goal_location": self.lab.topology.coords[self.lab.goal_room],
+            "button_locations": self.lab.button_location_matrix,
+            "button_door_behavior": self.lab.button_edges if sparse else self.lab.button2door_behavior_matrix,
+        }
+        if sparse:
+            static["walls"] = self.lab.room_trans_edges
+        doors = self.lab.door_edges if sparse else self._door_states()
+        if self._obs is None or self._obs["door_states"].shape != doors.shape or \
+                self._obs["button_door_behavior"].shape != static["button_door_behavior"].shape:
+            self._obs = {key: np.zeros(space.shape, dtype=np.int8) for key, space in self.observation_space.spaces.items()}
+            for key, value in static.items():
+                self._obs[key] = np.zeros(value.shape, dtype=np.int8)
+            self._obs["door_states"] = np.zeros(doors.shape, dtype=np.int8)
+            self._size["obs"] = self._obs
+        for key, value in static.items():
+            np.copyto(self._obs[key], value, casting="unsafe")
+        self._obs_doors_dirty = True
 
     def _get_obs(self):
+        if self.obs_buffers:
+            # Zero-allocation path: the same dict and arrays are returned on every step and overwritten in
+            # place by the next step/reset. Callers that keep observations (demo buffers, replay) must copy
+            # them, e.g. {k: v.copy() for k, v in obs.items()}; SB3 vec envs already copy into their buffers.
+            obs = self._obs
+            obs["agent_location"][:] = self.agent_location
+            obs["last_pos"][:] = self.last_pos
+            if self._obs_doors_dirty:
+                np.copyto(obs["door_states"], self.lab.door_edges if self.state_mode == "sparse" else self._door_states(),
+                          casting="unsafe")
+                self._obs_doors_dirty = False
+            return obs
         goal_r, goal_c = self.lab.index_to_coord(self.lab.goal_room)
-        goal_r, goal_c = self.lab.index_to_coord(self.lab.goal_room)
+        if self.state_mode == "sparse":
+            return {
+                "agent_location": self.agent_location,
+                "goal_location": np.array([goal_r, goal_c], dtype=int),
+                "walls": self.lab.room_trans_edges.astype(int),
+                "door_states": self.lab.door_edges.astype(int),
+                "button_locations": self.lab.button_location_matrix.copy().astype(int),
+                "last_pos": self.last_pos,
+                "button_door_behavior": self.lab.button_edges.astype(int),
+            }
         return {
             "agent_location": self.agent_location,
             "goal_location": np.array([goal_r, goal_c], dtype=int),
-            "door_states": self.lab.door_state_matrix.copy().astype(int),
+            "door_states": self._door_states().copy().astype(int),
             "button_locations": self.lab.button_location_matrix.copy().astype(int),
             "last_pos": self.last_pos,
             "button_door_behavior": self.lab.button2door_behavior_matrix.copy().astype(int),
@@ -278,44 +630,29 @@ class LabEnv(gym.Env):
                 width=3,
             )
 
-        # Draw Walls and Doors
-        for r in range(self.grid_size):
-            for c in range(self.grid_size):
-                curr_idx = self.lab.coord_to_index(r, c)
-                
+        # Draw Walls and Doors (one line per grid edge)
+        door_states = self._door_states()
+        for curr_idx, next_idx in self.lab.topology.edges:
+            r, c = self.lab.topology.coord_list[curr_idx]
+            has_connection = self.lab.room_trans_matrix[curr_idx, next_idx] == 1
+            is_open = door_states[curr_idx, next_idx] == 1
+            
+            if next_idx == curr_idx + 1:
                 # Right Connection
-                if c + 1 < self.grid_size:
-                    right_idx = self.lab.coord_to_index(r, c + 1)
-                    has_connection = self.lab.room_trans_matrix[curr_idx, right_idx] == 1
-                    is_open = self.lab.door_state_matrix[curr_idx, right_idx] == 1
-                    
-                    start_pos = ((c + 1) * pix_square_size, r * pix_square_size)
-                    end_pos = ((c + 1) * pix_square_size, (r + 1) * pix_square_size)
-                    
-                    if not has_connection:
-                        # Draw Wall
-                        pygame.draw.line(canvas, (0, 0, 0), start_pos, end_pos, width=5)
-                    else:
-                        # Draw Door
-                        color = (0, 255, 0) if is_open else (255, 0, 0)
-                        pygame.draw.line(canvas, color, start_pos, end_pos, width=5)
-
+                start_pos = ((c + 1) * pix_square_size, r * pix_square_size)
+                end_pos = ((c + 1) * pix_square_size, (r + 1) * pix_square_size)
+            else:
                 # Down Connection
-                if r + 1 < self.grid_size:
-                    down_idx = self.lab.coord_to_index(r + 1, c)
-                    has_connection = self.lab.room_trans_matrix[curr_idx, down_idx] == 1
-                    is_open = self.lab.door_state_matrix[curr_idx, down_idx] == 1
-                    
-                    start_pos = (c * pix_square_size, (r + 1) * pix_square_size)
-                    end_pos = ((c + 1) * pix_square_size, (r + 1) * pix_square_size)
-                    
-                    if not has_connection:
-                        # Draw Wall
-                        pygame.draw.line(canvas, (0, 0, 0), start_pos, end_pos, width=5)
-                    else:
-                        # Draw Door
-                        color = (0, 255, 0) if is_open else (255, 0, 0)
-                        pygame.draw.line(canvas, color, start_pos, end_pos, width=5)
+                start_pos = (c * pix_square_size, (r + 1) * pix_square_size)
+                end_pos = ((c + 1) * pix_square_size, (r + 1) * pix_square_size)
+            
+            if not has_connection:
+                # Draw Wall
+                pygame.draw.line(canvas, (0, 0, 0), start_pos, end_pos, width=5)
+            else:
+                # Draw Door
+                color = (0, 255, 0) if is_open else (255, 0, 0)
+                pygame.draw.line(canvas, color, start_pos, end_pos, width=5)
 
         # Draw Buttons
         for r in range(self.grid_size):
@@ -368,30 +705,52 @@ class LabEnv(gym.Env):
             )
 
     def close(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
         if self.window is not None:
             pygame.display.quit()
             pygame.quit()
     
     def action_masks(self):
-        mask = np.zeros(5 + self.max_rooms, dtype=np.int8)
+        # Maintained incrementally by reset/step, also published as info["action_mask"]
+        return self.action_mask.copy()
+
+    def set_mask_buffer(self, buffer):
+        """
+        Keeps the action mask directly in `buffer` (an int8 row of a (num_envs, actions) array, or a
+        SharedMaskHandle of one in shared memory), so a vec env can read every mask with one array
+        access instead of an action_masks() call per env (see share_action_masks).
+        """
+        if not isinstance(buffer, np.ndarray):
+            # Keep the handle, its shared memory mapping must live as long as the buffer
+            self._mask_handle = buffer
+            buffer = buffer.attach()
+        assert buffer.shape == self.action_mask.shape and buffer.dtype == np.int8, "Mask buffer must be an int8 row of the action size"
+        buffer[:] = self.action_mask
+        self.action_mask = buffer
+
+    def _update_action_mask(self, moved=True):
+        # After a move the whole mask belongs to the new room, after a button press only the doors changed
+        mask = self.action_mask
         current_r, current_c = self.agent_location
         current_idx = self.lab.coord_to_index(current_r, current_c)
         
-        # 1. Check Moves (Right, Up, Left, Down)
-        deltas = [(0, 1), (-1, 0), (0, -1), (1, 0)]
-        
-        for i, (dr, dc) in enumerate(deltas):
-            new_r, new_c = current_r + dr, current_c + dc
-            
-            if 0 <= new_r < self.grid_size and 0 <= new_c < self.grid_size:
-                target_idx = self.lab.coord_to_index(new_r, new_c)
-                mask[i] = self.lab.door_state_matrix[current_idx, target_idx]
+        # 1. Check Moves (Right, Up, Left, Down) to the grid neighbours
+        if self.state_mode == "sparse":
+            # O(1) per direction through the room's edge list
+            edges = self.lab.neighbor_edges[current_idx]
+            mask[:4] = (edges >= 0) & (self.lab.door_edges[edges] == 1)
+        else:
+            mask[:4] = 0
+            for direction, target_idx, _ in self.lab.topology.moves[current_idx]:
+                mask[direction] = self._is_door_open(current_idx, target_idx)
+        if not moved:
+            return
         
         # 2. Check Backtrack (Action 4)
-        if self.last_pos[0] != -1:
-            mask[4] = 1
+        mask[4] = self.last_pos[0] != -1
             
         # 3. Check Buttons
+        mask[5:] = 0
         mask[5:5+self.lab.number_of_buttons] = self.lab.button_location_matrix[current_idx]
-        
-        return mask
+
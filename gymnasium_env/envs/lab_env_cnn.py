@@ -3,9 +3,77 @@ from gymnasium import spaces
 import numpy as np
 from .lab_env import LabEnv
 
+
+def encode_static_batch(topology, goal_room, room_trans_matrix, button_location_matrix, button2door_behavior_matrix,
+                        out=None):
+    """
+    Channels of the CNN observation that stay constant during an episode (walls, goal, button locations
+    and behaviours) for a batch of labs of one grid size: goal_room (n,), room_trans_matrix (n, rooms, rooms),
+    button_location_matrix (n, rooms, buttons), button2door_behavior_matrix (n, buttons, rooms, rooms).
+    Writes into `out` (n, 4 + 2 * buttons, spatial, spatial) if given. Channels 1 and 3 are left empty.
+    """
+    goal_room = np.asarray(goal_room)
+    n, buttons = len(goal_room), button_location_matrix.shape[-1]
+    size = topology.spatial_size
+    if out is None:
+        out = np.zeros((n, 4 + 2 * buttons, size, size), dtype=np.float32)
+    else:
+        out[...] = 0.0
+    batch = np.arange(n)
+    room_rows, room_cols = topology.room_cells[:, 0], topology.room_cells[:, 1]
+    edge_rows, edge_cols = topology.edge_cells[:, 0], topology.edge_cells[:, 1]
+    edge_a, edge_b = topology.edges[:, 0], topology.edges[:, 1]
+
+    # Channel 0: Walls (room centers and paths with a room transition are cleared)
+    out[:, 0] = 1.0
+    out[:, 0, room_rows, room_cols] = 0.0
+    lab_idx, edge_idx = np.nonzero(room_trans_matrix[:, edge_a, edge_b] == 1)
+    out[lab_idx, 0, edge_rows[edge_idx], edge_cols[edge_idx]] = 0.0
+
+    # Channel 2: Goal Location
+    goal_cells = topology.room_cells[goal_room]
+    out[batch, 2, goal_cells[:, 0], goal_cells[:, 1]] = 1.0
+
+    # Buttons and Behaviors (which doors each button toggles)
+    out[:, 4:4 + buttons, room_rows, room_cols] = np.swapaxes(button_location_matrix, 1, 2) == 1
+    out[:, 4 + buttons:4 + 2 * buttons, edge_rows, edge_cols] = button2door_behavior_matrix[:, :, edge_a, edge_b] == 1
+    return out
+
+
+def encode_cnn_batch(topology, static, agent_room, room_trans_matrix, door_state_matrix, out=None):
+    """
+    Full CNN observations of a batch of labs: the cached static channels (see encode_static_batch)
+    plus the agent (channel 1) and closed doors (channel 3). Writes into one contiguous
+    (n, channels, spatial, spatial) float32 array, `out` if given.
+    """
+    agent_room = np.asarray(agent_room)
+    if out is None:
+        out = static.copy()
+    else:
+        np.copyto(out, static)
+    edge_rows, edge_cols = topology.edge_cells[:, 0], topology.edge_cells[:, 1]
+    edge_a, edge_b = topology.edges[:, 0], topology.edges[:, 1]
+
+    # Channel 1: Agent Location
+    agent_cells = topology.room_cells[agent_room]
+    out[np.arange(len(agent_room)), 1, agent_cells[:, 0], agent_cells[:, 1]] = 1.0
+
+    # Channel 3: Closed Doors (0 is closed)
+    closed = (room_trans_matrix[:, edge_a, edge_b] == 1) & (door_state_matrix[:, edge_a, edge_b] == 0)
+    lab_idx, edge_idx = np.nonzero(closed)
+    out[lab_idx, 3, edge_rows[edge_idx], edge_cols[edge_idx]] = 1.0
+    return out
+
+
 class LabEnvCNN(LabEnv):
-    def __init__(self, render_mode=None, number_of_rooms=4, valid_seeds=None, max_rooms=None):
-        super().__init__(render_mode, number_of_rooms, valid_seeds, max_rooms)
+    def __init__(self, render_mode=None, number_of_rooms=4, valid_seeds=None, max_rooms=None, state_mode="dense",
+                 difficulty=None, difficulty_weights=None, augment=False, number_of_buttons=4):
+        # The spatial encoding reads the dense matrices, sparse labs use LabEnv's per-edge observation
+        assert state_mode != "sparse", "LabEnvCNN supports the dense and bitset state modes"
+        # Static channels of the current episode, (1, channels, spatial, spatial), built on the first observation
+        self._static_obs = None
+        super().__init__(render_mode, number_of_rooms, valid_seeds, max_rooms, state_mode, difficulty, difficulty_weights,
+                         augment, number_of_buttons)
         
         # Override observation space
         # Grid size of the spatial map: 2 * grid_size + 1
@@ -27,92 +95,17 @@ class LabEnvCNN(LabEnv):
             dtype=np.float32
         ) 
 
-    def _get_obs(self):
-        obs = np.zeros((self.num_channels, self.spatial_size, self.spatial_size), dtype=np.float32)
-        
-        # Channel 0: Walls
-        obs[0, :, :] = 1.0
-        
-        # Clear out the room centers
-        for r in range(self.grid_size):
-            for c in range(self.grid_size):
-                obs[0, 2*r + 1, 2*c + 1] = 0.0
-                
-        # Clear out paths where there is a room transition (i.e. not a solid wall)
-        for r in range(self.grid_size):
-            for c in range(self.grid_size):
-                curr_idx = self.lab.coord_to_index(r, c)
-                curr_sr, curr_sc = 2*r + 1, 2*c + 1
-                
-                # Right
-                if c + 1 < self.grid_size:
-                    right_idx = self.lab.coord_to_index(r, c + 1)
-                    if self.lab.room_trans_matrix[curr_idx, right_idx] == 1:
-                        # Clear wall
-                        obs[0, curr_sr, curr_sc + 1] = 0.0
-                # Down
-                if r + 1 < self.grid_size:
-                    down_idx = self.lab.coord_to_index(r + 1, c)
-                    if self.lab.room_trans_matrix[curr_idx, down_idx] == 1:
-                        # Clear wall
-                        obs[0, curr_sr + 1, curr_sc] = 0.0
+    def reset(self, seed=None, options=None):
+        self._static_obs = None
+        return super().reset(seed=seed, options=options)
 
-        # Channel 1: Agent Location
-        agent_r, agent_c = self.agent_location
-        obs[1, 2*agent_r + 1, 2*agent_c + 1] = 1.0
-        
-        # Channel 2: Goal Location
-        goal_r, goal_c = self.lab.index_to_coord(self.lab.goal_room)
-        obs[2, 2*goal_r + 1, 2*goal_c + 1] = 1.0
-        
-        # Channel 3: Closed Doors
-        for r in range(self.grid_size):
-            for c in range(self.grid_size):
-                curr_idx = self.lab.coord_to_index(r, c)
-                curr_sr, curr_sc = 2*r + 1, 2*c + 1
-                
-                # Right
-                if c + 1 < self.grid_size:
-                    right_idx = self.lab.coord_to_index(r, c + 1)
-                    if self.lab.room_trans_matrix[curr_idx, right_idx] == 1:
-                        if self.lab.door_state_matrix[curr_idx, right_idx] == 0: # 0 is closed
-                            obs[3, curr_sr, curr_sc + 1] = 1.0
-                            
-                # Down
-                if r + 1 < self.grid_size:
-                    down_idx = self.lab.coord_to_index(r + 1, c)
-                    if self.lab.room_trans_matrix[curr_idx, down_idx] == 1:
-                        if self.lab.door_state_matrix[curr_idx, down_idx] == 0:
-                            obs[3, curr_sr + 1, curr_sc] = 1.0
-
-        # Buttons and Behaviors
-        base_btn_idx = 4
-        base_beh_idx = 4 + self.lab.number_of_buttons
-        
-        for b in range(self.lab.number_of_buttons):
-            # Button Location
-            for r in range(self.grid_size):
-                for c in range(self.grid_size):
-                    curr_idx = self.lab.coord_to_index(r, c)
-                    if self.lab.button_location_matrix[curr_idx, b] == 1:
-                        obs[base_btn_idx + b, 2*r + 1, 2*c + 1] = 1.0
-            
-            # Button Behavior (which doors it toggles)
-            for r in range(self.grid_size):
-                for c in range(self.grid_size):
-                    curr_idx = self.lab.coord_to_index(r, c)
-                    curr_sr, curr_sc = 2*r + 1, 2*c + 1
-                    
-                    # Right
-                    if c + 1 < self.grid_size:
-                        right_idx = self.lab.coord_to_index(r, c + 1)
-                        if self.lab.button2door_behavior_matrix[b, curr_idx, right_idx] == 1:
-                            obs[base_beh_idx + b, curr_sr, curr_sc + 1] = 1.0
-                            
-                    # Down
-                    if r + 1 < self.grid_size:
-                        down_idx = self.lab.coord_to_index(r + 1, c)
-                        if self.lab.button2door_behavior_matrix[b, curr_idx, down_idx] == 1:
-                            obs[base_beh_idx + b, curr_sr + 1, curr_sc] = 1.0
-
-        return obs
+    def _get_obs(self):
+        lab = self.lab
+        if self._static_obs is None:
+            self._static_obs = encode_static_batch(
+                lab.topology, [lab.goal_room], lab.room_trans_matrix[None],
+                lab.button_location_matrix[None], lab.button2door_behavior_matrix[None],
+            )
+        agent_idx = lab.coord_to_index(*self.agent_location)
+        return encode_cnn_batch(lab.topology, self._static_obs, [agent_idx], lab.room_trans_matrix[None],
+                                self._door_states()[None])[0]
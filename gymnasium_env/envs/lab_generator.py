@@ -1,12 +1,19 @@
+import hashlib
 import numpy as np
 from collections import deque
+from gymnasium_env.solver.state_space import LabStateSpace
+from .lab_topology import LabTopology
 
 
 class LabGenerator:
-    def __init__(self, number_of_rooms=4):
+    def __init__(self, number_of_rooms=4, number_of_buttons=4, sparse=False):
+        # sparse: the lab lives in per-edge arrays (room_trans_edges, door_edges, button_edges) and no
+        # (rooms, rooms) matrix is built, for large grids; to_dense() fills the dense matrices on demand
+        self.sparse = sparse
         self.number_of_rooms = number_of_rooms
-        self.grid_size = int(np.sqrt(self.number_of_rooms))
-        assert self.grid_size ** 2 == self.number_of_rooms, "Number of rooms must be a perfect square for Grid World"
+        # Grid geometry is shared by every generator of this size
+        self.topology = LabTopology.of(number_of_rooms)
+        self.grid_size = self.topology.grid_size
 
         self.room_trans_matrix = None
         self.start_room = -1
@@ -16,26 +23,67 @@ class LabGenerator:
         self.button_location_matrix = None
         self.button2door_behavior_matrix = None
         self.valid_layout = False
-        self.number_of_buttons = 4
-        self.generate_lab()
-
-    def get_grid_adjacency(self):
-        # Returns a mask of all VALID connections in a grid
-        adj = np.zeros((self.number_of_rooms, self.number_of_rooms), dtype=int)
-        for r in range(self.grid_size):
-            for c in range(self.grid_size):
-                curr = r * self.grid_size + c
-                # Down
-                if r + 1 < self.grid_size:
-                    next_node = (r + 1) * self.grid_size + c
-                    adj[curr, next_node] = adj[next_node, curr] = 1
-                # Right
-                if c + 1 < self.grid_size:
-                    next_node = r * self.grid_size + (c + 1)
-                    adj[curr, next_node] = adj[next_node, curr] = 1
-        # Self loop
-        np.fill_diagonal(adj, 1)
-        return adj
+        self.number_of_buttons = number_of_buttons
+
+        # Grid edge list for the compact (bitset) representation: bit e of a door
+        # bitset is the door between rooms edges[e, 0] and edges[e, 1]
+        self.edges = self.topology.edges
+        self.number_of_edges = self.topology.number_of_edges
+        self.door_bits = 0
+        self.trans_bits = 0
+        self.button_bits = []
+        # neighbors[room, d] / neighbor_edges[room, d]: room and edge in direction d (Right, Up, Left, Down), -1 outside
+        self.neighbors, self.neighbor_edges = self.topology.neighbors, self.topology.neighbor_edges
+
+        # Sparse lab: one entry per grid edge
+        self.room_trans_edges = None
+        self.door_edges = None
+        self.button_edges = None
+
+        if not self.sparse:
+            # (rooms, rooms) tables, built once per grid size
+            self.edge_index = self.topology.edge_index
+            self.grid_adj = self.topology.grid_adj
+        # Room permutations of the 8 grid symmetries (see LabTopology._grid_symmetries)
+        self.symmetries, self.symmetry_directions = self.topology.symmetries, self.topology.symmetry_directions
+        # No lab until generate_lab (or a dataset / prefetcher load) fills one in
+
+    def edge_between(self, room, other):
+        # Edge id between two rooms, -1 if they are not grid neighbours
+        for _, neighbor, edge in self.topology.moves[room]:
+            if neighbor == other:
+                return edge
+        return -1
+
+    def pack_edges(self, matrix):
+        # Dense (rooms, rooms) 0/1 matrix -> integer with one bit per grid edge
+        bits = np.asarray(matrix)[self.edges[:, 0], self.edges[:, 1]].astype(np.uint8)
+        return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+    def unpack_edges(self, bits, diagonal=1, out=None):
+        # Integer edge bitset -> dense (rooms, rooms) matrix, diagonal set to `diagonal`
+        n_bytes = (self.number_of_edges + 7) // 8
+        edge_values = np.unpackbits(
+            np.frombuffer(bits.to_bytes(n_bytes, "little"), dtype=np.uint8), bitorder="little"
+        )[:self.number_of_edges]
+        if out is None:
+            out = np.zeros((self.number_of_rooms, self.number_of_rooms), dtype=int)
+        else:
+            out.fill(0)
+        out[self.edges[:, 0], self.edges[:, 1]] = edge_values
+        out[self.edges[:, 1], self.edges[:, 0]] = edge_values
+        np.fill_diagonal(out, diagonal)
+        return out
+
+    def encode_bitsets(self):
+        """
+        Compact state of the current lab: doors, walls and every button behaviour as edge bitsets.
+        A button press is then door_bits = (door_bits ^ button_bits[b]) & trans_bits
+        """
+        self.door_bits = self.pack_edges(self.door_state_matrix)
+        self.trans_bits = self.pack_edges(self.room_trans_matrix)
+        self.button_bits = [self.pack_edges(behavior) for behavior in self.button2door_behavior_matrix]
+        return self.door_bits, self.trans_bits, self.button_bits
 
     def generate_rooms(self):
         # Generate random matrix
@@ -45,8 +93,7 @@ class LabGenerator:
         np.fill_diagonal(rooms, 1) # Self connected
         
         # Apply Grid Mask
-        grid_adj = self.get_grid_adjacency()
-        rooms = rooms * grid_adj
+        rooms = rooms * self.grid_adj
         return rooms
 
     def sanity_check(self):
@@ -104,8 +151,7 @@ class LabGenerator:
         single_button_matrix += single_button_matrix.T
         
         # Apply Grid Mask so buttons only affect physical doors
-        grid_adj = self.get_grid_adjacency()
-        single_button_matrix = single_button_matrix * grid_adj
+        single_button_matrix = single_button_matrix * self.grid_adj
         
         # set diagonal to zero as there are no doors that lead to the same room
         np.fill_diagonal(single_button_matrix, 0)
@@ -115,67 +161,63 @@ class LabGenerator:
         """
         Performs a full state-space BFS to check if the goal is reachable
         considering walls, doors, buttons, AND backtracking.
-        State: (current_room_idx, button_toggle_mask, last_room_idx)
+        State: (current_room_idx, button_toggle_mask, last_room_idx), integer encoded by LabStateSpace
+        which precomputes the open doors of every (room, mask) pair once per lab.
         """
-        # Initial state: Start room, no buttons toggled (mask=0), last_room = -1 (none)
-        start_state = (self.start_room, 0, -1)
-        
-        queue = deque([start_state])
-        visited = {start_state}
-        
-        initial_doors = self.door_state_matrix.astype(int)
-        
+        return LabStateSpace.from_generator(self).is_solvable()
+
+    def sparse_sanity_check(self):
+        # Wall-only reachability from start to goal over the edge list
+        visited = np.zeros(self.number_of_rooms, dtype=bool)
+        visited[self.start_room] = True
+        queue = deque([self.start_room])
         while queue:
-            curr_room, curr_mask, last_room = queue.popleft()
-            
-            if curr_room == self.goal_room:
+            current = queue.popleft()
+            if current == self.goal_room:
                 return True
-            
-            # 1. Try Pressing Buttons in current room
-            # Get buttons available in current room
-            available_buttons = np.where(self.button_location_matrix[curr_room] == 1)[0]
-            
-            for btn_idx in available_buttons:
-                new_mask = curr_mask ^ (1 << btn_idx) # Toggle bit
-                next_state = (curr_room, new_mask, last_room)
-                if next_state not in visited:
-                    visited.add(next_state)
-                    queue.append(next_state)
-
-            # 2. Try Backtracking (always valid if last_room is not -1)
-            if last_room != -1:
-                # Backtrack takes us to last_room. New last_room becomes curr_room.
-                backtrack_state = (last_room, curr_mask, curr_room)
-                if backtrack_state not in visited:
-                    visited.add(backtrack_state)
-                    queue.append(backtrack_state)
-
-            # 3. Try Moving (Normal)
-            # We need to know which doors are open in the current configuration
-            
-            # Start with initial state of doors for current room
-            curr_doors_row = initial_doors[curr_room].copy()
-            
-            # Apply toggles
-            for btn_idx in range(self.number_of_buttons):
-                if (curr_mask >> btn_idx) & 1: # if button Toggled
-                    behavior_row = self.button2door_behavior_matrix[btn_idx][curr_room]
-                    curr_doors_row = np.bitwise_xor(curr_doors_row, behavior_row)
-            
-            # Ensure walls are respected
-            valid_neighbors = np.where((curr_doors_row == 1) & (self.room_trans_matrix[curr_room] == 1))[0]
-            
-            for neighbor in valid_neighbors:
-                next_state = (neighbor, curr_mask, curr_room)
-                if next_state not in visited:
-                    visited.add(next_state)
-                    queue.append(next_state)
-                    
+            for d in range(4):
+                edge = self.neighbor_edges[current, d]
+                if edge >= 0 and self.room_trans_edges[edge] and not visited[self.neighbors[current, d]]:
+                    visited[self.neighbors[current, d]] = True
+                    queue.append(self.neighbors[current, d])
         return False
 
+    def generate_sparse_lab(self):
+        """
+        Sparse counterpart of generate_lab: every grid edge is a wall or a door with probability 1/2,
+        door states and button behaviours are drawn per edge. Same distribution over labs as the dense
+        generator, but O(edges) memory and draws (seeds give different labs than in dense mode).
+        """
+        self.start_room = self.rng.integers(0, self.number_of_rooms)
+        self.goal_room = self.rng.choice([x for x in range(self.number_of_rooms) if x != self.start_room])
+        while True:
+            self.room_trans_edges = self.rng.integers(0, 2, size=self.number_of_edges).astype(np.uint8)
+            if not self.sparse_sanity_check():
+                continue
+            self.door_edges = self.rng.integers(0, 2, size=self.number_of_edges).astype(np.uint8) & self.room_trans_edges
+            self.generate_button_locations()
+            self.button_edges = self.rng.integers(0, 2, size=(self.number_of_buttons, self.number_of_edges)).astype(np.uint8)
+            if self.is_fully_solvable():
+                break
+
+    def to_dense(self, door_edges=None):
+        # Fills the dense matrices from the edge arrays (rendering, oracle); `door_edges` defaults to the current doors
+        def dense(values, diagonal):
+            matrix = np.zeros((self.number_of_rooms, self.number_of_rooms), dtype=int)
+            matrix[self.edges[:, 0], self.edges[:, 1]] = values
+            matrix[self.edges[:, 1], self.edges[:, 0]] = values
+            np.fill_diagonal(matrix, diagonal)
+            return matrix
+        self.room_trans_matrix = dense(self.room_trans_edges, 1)
+        self.door_state_matrix = dense(self.door_edges if door_edges is None else door_edges, 1)
+        self.button2door_behavior_matrix = np.array([dense(behavior, 0) for behavior in self.button_edges])
+
     def generate_lab(self, seed=None):
         if seed is not None:
             self.rng = np.random.default_rng(seed)
+        if self.sparse:
+            self.generate_sparse_lab()
+            return
             
         attempts = 0
         self.start_room = self.rng.integers(0, self.number_of_rooms)
@@ -199,8 +241,245 @@ class LabGenerator:
                 # print(f"Generated solvable lab after {attempts} attempts")
                 break
 
+    def generate_batch(self, seeds=None, count=None, batch_size=4096):
+        """
+        Generates many labs at once and returns them as stacked arrays (same fields as the maze dataset).
+        Every lab draws from its own default_rng(seed) exactly like generate_lab(seed), so the result
+        is identical to generating the seeds one by one. Layouts, door states and behaviours are
+        post-processed as stacked arrays, connectivity and solvability are checked for the whole batch
+        at once and only the rejected slots are redrawn.
+        seeds: iterable of lab seeds, or count: number of labs with seeds drawn from self.rng
+        """
+        if seeds is None:
+            seeds = self.rng.integers(0, 2**31 - 1, size=count)
+        seeds = np.asarray(seeds, dtype=np.int64).reshape(-1)
+
+        chunks = [self._generate_batch_chunk(seeds[i:i + batch_size]) for i in range(0, len(seeds), batch_size)]
+        if not chunks:
+            chunks = [self._generate_batch_chunk(seeds)]
+        return {k: np.concatenate([chunk[k] for chunk in chunks]) for k in chunks[0]}
+
+    def _generate_batch_chunk(self, seeds):
+        n, rooms, buttons = len(seeds), self.number_of_rooms, self.number_of_buttons
+        rngs = [np.random.default_rng(int(seed)) for seed in seeds]
+
+        start_room = np.empty(n, dtype=np.int64)
+        goal_room = np.empty(n, dtype=np.int64)
+        for k, rng in enumerate(rngs):
+            start_room[k] = rng.integers(0, rooms)
+            goal_room[k] = rng.choice([x for x in range(rooms) if x != start_room[k]])
+
+        room_trans_matrix = np.zeros((n, rooms, rooms), dtype=np.int64)
+        door_state_matrix = np.zeros((n, rooms, rooms), dtype=np.int64)
+        button_location_matrix = np.zeros((n, rooms, buttons), dtype=np.int64)
+        button2door_behavior_matrix = np.zeros((n, buttons, rooms, rooms), dtype=np.int64)
+
+        pending = np.arange(n)
+        while pending.size:
+            # 1. Generate Layouts
+            trans = self._symmetric_batch(
+                np.array([rngs[k].integers(0, 2, size=(rooms, rooms)) for k in pending]), diagonal=1
+            )
+
+            # 2. Fast Fail: Check basic connectivity (Walls only)
+            connected = self.batch_sanity_check(trans, start_room[pending], goal_room[pending])
+            candidates = pending[connected]
+            if candidates.size == 0:
+                continue
+            trans = trans[connected]
+
+            # 3. Generate Details (same draw order per lab as generate_lab)
+            doors = self._symmetric_batch(
+                np.array([rngs[k].integers(0, 2, size=(rooms, rooms)) for k in candidates]), diagonal=1
+            )
+            doors[trans == 0] = 0
+            btn_locations = np.array([rngs[k].integers(0, 2, size=(rooms, buttons)) for k in candidates])
+            behaviors = self._symmetric_batch(
+                np.array([[rngs[k].integers(0, 2, size=(rooms, rooms)) for _ in range(buttons)] for k in candidates]),
+                diagonal=0,
+            )
+
+            # 4. Full Validation
+            solvable = self.batch_is_fully_solvable(
+                start_room[candidates], goal_room[candidates], trans, doors, btn_locations, behaviors
+            )
+            accepted = candidates[solvable]
+            room_trans_matrix[accepted] = trans[solvable]
+            door_state_matrix[accepted] = doors[solvable]
+            button_location_matrix[accepted] = btn_locations[solvable]
+            button2door_behavior_matrix[accepted] = behaviors[solvable]
+
+            still_pending = np.ones(n, dtype=bool)
+            still_pending[accepted] = False
+            pending = pending[still_pending[pending]]
+
+        return {
+            "seeds": seeds,
+            "start_room": start_room,
+            "goal_room": goal_room,
+            "room_trans_matrix": room_trans_matrix,
+            "door_state_matrix": door_state_matrix,
+            "button_location_matrix": button_location_matrix,
+            "button2door_behavior_matrix": button2door_behavior_matrix,
+        }
+
+    def _symmetric_batch(self, raw, diagonal):
+        # Stacked version of generate_rooms / generate_single_button_matrix post-processing
+        matrices = np.triu(raw, 1)
+        matrices = matrices + np.swapaxes(matrices, -1, -2)
+        diag = np.arange(self.number_of_rooms)
+        matrices[..., diag, diag] = diagonal
+        return matrices * self.grid_adj
+
+    def batch_sanity_check(self, trans, start_rooms, goal_rooms):
+        # Wall-only reachability from start to goal for a batch of layouts (K, rooms, rooms)
+        k = len(trans)
+        connections = trans == 1
+        reached = np.zeros((k, self.number_of_rooms), dtype=bool)
+        reached[np.arange(k), start_rooms] = True
+        for _ in range(self.number_of_rooms - 1):
+            expanded = reached | (reached[:, :, None] & connections).any(axis=1)
+            if np.array_equal(expanded, reached):
+                break
+            reached = expanded
+        return reached[np.arange(k), goal_rooms]
+
+    def batch_is_fully_solvable(self, start_rooms, goal_rooms, trans, doors, btn_locations, behaviors):
+        """
+        Batched version of is_fully_solvable: one BFS level for all labs per iteration over
+        boolean state tensors of shape (K, room, button_mask, last_room), where last_room == rooms means none.
+        """
+        k, rooms, buttons = len(trans), self.number_of_rooms, self.number_of_buttons
+        masks = 1 << buttons
+        # Labs per pass, bounds the (K, room, mask, last_room) state tensors to about 16M cells each
+        labs_per_pass = max(1, (1 << 24) // (rooms * masks * (rooms + 1)))
+        if k > labs_per_pass:
+            return np.concatenate([
+                self.batch_is_fully_solvable(start_rooms[i:i + labs_per_pass], goal_rooms[i:i + labs_per_pass],
+                                             trans[i:i + labs_per_pass], doors[i:i + labs_per_pass],
+                                             btn_locations[i:i + labs_per_pass], behaviors[i:i + labs_per_pass])
+                for i in range(0, k, labs_per_pass)
+            ])
+        batch = np.arange(k)
+
+        # Door rows for every button mask: open[k, mask, room, neighbor]
+        open_doors = np.zeros((k, masks, rooms, rooms), dtype=bool)
+        open_doors[:, 0] = doors == 1
+        toggles = behaviors == 1
+        for mask in range(1, masks):
+            low_bit = (mask & -mask).bit_length() - 1
+            open_doors[:, mask] = open_doors[:, mask ^ (1 << low_bit)] ^ toggles[:, low_bit]
+        open_doors &= (trans[:, None] == 1)
+        # moves[k, room, mask, neighbor]
+        moves = open_doors.transpose(0, 2, 1, 3)
+        has_button = btn_locations == 1
+
+        visited = np.zeros((k, rooms, masks, rooms + 1), dtype=bool)
+        visited[batch, start_rooms, 0, rooms] = True
+        frontier = visited.copy()
+        solved = np.zeros(k, dtype=bool)
+        # Labs still searching; solved or exhausted labs are dropped from the working arrays
+        active = batch
+
+        while active.size:
+            solved[active] = visited[batch[:len(active)], goal_rooms[active]].any(axis=(1, 2))
+            searching = ~solved[active] & frontier.any(axis=(1, 2, 3))
+            if not searching.all():
+                active = active[searching]
+                visited, frontier = visited[searching], frontier[searching]
+                moves, has_button = moves[searching], has_button[searching]
+            new = np.zeros_like(visited)
+
+            # 1. Pressing Buttons: (r, m, l) -> (r, m ^ bit, l)
+            for btn_idx in range(buttons):
+                pressable = frontier & has_button[:, :, btn_idx, None, None]
+                new |= pressable[:, :, np.arange(masks) ^ (1 << btn_idx), :]
+
+            # 2. Backtracking: (r, m, l) -> (l, m, r)
+            new[..., :rooms] |= frontier[..., :rooms].transpose(0, 3, 2, 1)
+
+            # 3. Moving: (r, m, any l) -> (n, m, r) through open doors
+            in_room = frontier.any(axis=3)
+            new[..., :rooms] |= (in_room[..., None] & moves).transpose(0, 3, 2, 1)
+
+            frontier = new & ~visited
+            visited |= frontier
+
+        return solved
+
+    def canonical_batch(self, start_room, goal_room, room_trans_matrix, door_state_matrix,
+                        button_location_matrix, button2door_behavior_matrix):
+        """
+        Canonical form of a batch of labs under the 8 grid symmetries and button permutations.
+        Only what affects play is kept: doors and behaviours on walls and behaviours of buttons that
+        are placed nowhere are cleared. Per symmetry the buttons are sorted by their (location,
+        behaviour) bytes, and the lexicographically smallest of the 8 encodings is the canonical one.
+        Returns (keys uint8 (K, L), symmetry index (K,), 64-bit hash (K,) as uint64).
+        """
+        start_room = np.asarray(start_room, dtype=np.int64).reshape(-1)
+        goal_room = np.asarray(goal_room, dtype=np.int64).reshape(-1)
+        k = len(start_room)
+        trans = np.asarray(room_trans_matrix, dtype=np.uint8).reshape(k, self.number_of_rooms, self.number_of_rooms)
+        doors = np.asarray(door_state_matrix, dtype=np.uint8).reshape(trans.shape) * trans
+        locations = np.asarray(button_location_matrix, dtype=np.uint8).reshape(k, self.number_of_rooms, -1)
+        behaviors = np.asarray(button2door_behavior_matrix, dtype=np.uint8).reshape(k, -1, *trans.shape[1:])
+        behaviors = behaviors * trans[:, None] * (locations.sum(axis=1) > 0)[:, :, None, None]
+        buttons = behaviors.shape[1]
+
+        encodings = []
+        for perm in self.symmetries:
+            inv = np.argsort(perm)
+            per_button = np.concatenate([
+                locations[:, inv].transpose(0, 2, 1),
+                behaviors[:, :, inv][:, :, :, inv].reshape(k, buttons, -1),
+            ], axis=2)
+            per_button = np.ascontiguousarray(per_button).view(np.dtype((np.void, per_button.shape[2])))
+            sorted_buttons = np.sort(per_button.reshape(k, buttons), axis=1)
+            encodings.append(np.concatenate([
+                perm[start_room][:, None], perm[goal_room][:, None],
+                trans[:, inv][:, :, inv].reshape(k, -1),
+                doors[:, inv][:, :, inv].reshape(k, -1),
+                np.ascontiguousarray(sorted_buttons).view(np.uint8).reshape(k, -1),
+            ], axis=1).astype(np.uint8))
+
+        encodings = np.ascontiguousarray(np.stack(encodings, axis=1))
+        symmetry = np.argsort(encodings.view(np.dtype((np.void, encodings.shape[2]))).reshape(k, 8), axis=1, kind="stable")[:, 0]
+        keys = encodings[np.arange(k), symmetry]
+        hashes = np.array([int.from_bytes(hashlib.blake2b(key.tobytes(), digest_size=8).digest(), "little")
+                           for key in keys], dtype=np.uint64)
+        return keys, symmetry, hashes
+
+    def canonical_form(self):
+        # (canonical key bytes, symmetry index that maps this lab onto it, 64-bit hash) of the current lab
+        keys, symmetry, hashes = self.canonical_batch(
+            self.start_room, self.goal_room, self.room_trans_matrix, self.door_state_matrix,
+            self.button_location_matrix, self.button2door_behavior_matrix,
+        )
+        return keys[0].tobytes(), int(symmetry[0]), int(hashes[0])
+
+    def canonical_hash(self):
+        # Equal for labs that are the same puzzle up to grid symmetry and button order
+        return self.canonical_form()[2]
+
+    def apply_symmetry(self, symmetry, button_order=None):
+        """
+        Transforms the current lab in place by grid symmetry `symmetry` (see LabTopology._grid_symmetries)
+        and reorders the buttons so that new button i is old button button_order[i].
+        """
+        perm = self.symmetries[symmetry]
+        inv = np.argsort(perm)
+        if button_order is None:
+            button_order = np.arange(self.number_of_buttons)
+        self.start_room = int(perm[self.start_room])
+        self.goal_room = int(perm[self.goal_room])
+        self.room_trans_matrix = self.room_trans_matrix[inv][:, inv]
+        self.door_state_matrix = self.door_state_matrix[inv][:, inv]
+        self.button_location_matrix = self.button_location_matrix[inv][:, button_order]
+        self.button2door_behavior_matrix = self.button2door_behavior_matrix[button_order][:, inv][:, :, inv]
+
     def coord_to_index(self, r, c):
         return r * self.grid_size + c
 
     def index_to_coord(self, i):
-        return np.array([i // self.grid_size, i % self.grid_size])
+        # Read-only row of the cached coordinate table
+        return self.topology.coords[i]
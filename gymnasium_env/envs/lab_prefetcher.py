@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .lab_generator import LabGenerator
+
+# LabGenerator attributes that make up a generated lab
+DENSE_FIELDS = ("start_room", "goal_room", "room_trans_matrix", "door_state_matrix",
+                "button_location_matrix", "button2door_behavior_matrix")
+SPARSE_FIELDS = ("start_room", "goal_room", "room_trans_edges", "door_edges",
+                 "button_location_matrix", "button_edges")
+
+# One generator per worker thread/process and lab configuration
+_worker_state = threading.local()
+
+
+def _generate_lab(number_of_rooms, number_of_buttons, sparse, seed):
+    labs = getattr(_worker_state, "labs", None)
+    if labs is None:
+        labs = _worker_state.labs = {}
+    key = (number_of_rooms, number_of_buttons, sparse)
+    lab = labs.get(key)
+    if lab is None:
+        lab = labs[key] = LabGenerator(number_of_rooms=number_of_rooms, number_of_buttons=number_of_buttons, sparse=sparse)
+    lab.generate_lab(seed=seed)
+    return {field: np.array(getattr(lab, field)) for field in (SPARSE_FIELDS if sparse else DENSE_FIELDS)}
+
+
+class LabPrefetcher:
+    """
+    Generates labs for upcoming seeds in the background, so resets that miss the dataset
+    do not run the rejection sampling of LabGenerator.generate_lab synchronously.
+    The env requests the seeds it will draw next (see LabEnv prefetch) and takes the results at reset.
+    workers=0 uses one background thread (works inside SubprocVecEnv workers, which cannot have
+    child processes), workers > 0 a pool of that many processes.
+    At most `capacity` labs are pending, the oldest request is dropped beyond that.
+    """
+
+    def __init__(self, capacity=8, workers=0):
+        self.capacity = capacity
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lab-prefetch")
+        self.pending = OrderedDict()
+        # hits: lab was ready at reset, waits: reset blocked on a running request, misses: never requested
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+
+    def request(self, number_of_rooms, number_of_buttons, sparse, seed):
+        key = (number_of_rooms, number_of_buttons, sparse, seed)
+        if key in self.pending:
+            return
+        while len(self.pending) >= self.capacity:
+            _, future = self.pending.popitem(last=False)
+            future.cancel()
+        self.pending[key] = self.executor.submit(_generate_lab, number_of_rooms, number_of_buttons, sparse, seed)
+
+    def load_into(self, lab, seed):
+        """
+        Copies the prefetched lab for `seed` into `lab`, waiting for it if it is still being generated.
+        Returns False (and counts a miss) if the seed was never requested, the caller then generates it.
+        """
+        future = self.pending.pop((lab.number_of_rooms, lab.number_of_buttons, lab.sparse, seed), None)
+        if future is None or future.cancelled():
+            self.misses += 1
+            return False
+        if future.done():
+            self.hits += 1
+        else:
+            self.waits += 1
+        for field, value in future.result().items():
+            setattr(lab, field, int(value) if value.ndim == 0 else value)
+        return True
+
+    def clear(self):
+        # Drops all pending requests (the seed sequence changed)
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def stats(self):
+        total = self.hits + self.waits + self.misses
+        return {
+            "hits": self.hits,
+            "waits": self.waits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+import numpy as np
+
+# Move directions in action order: Right, Up, Left, Down as (dr, dc)
+DIRECTIONS = ((0, 1), (-1, 0), (0, -1), (1, 0))
+
+# Topologies already built in this process, by number of rooms
+_topologies = {}
+
+
+class LabTopology:
+    """
+    Grid geometry of one grid size: room coordinates, neighbour and edge tables, the cells of the
+    CNN spatial map and the grid symmetries. Built once per size and shared (read-only) by every
+    LabGenerator, env and solver, get it with LabTopology.of(number_of_rooms).
+    The (rooms, rooms) tables edge_index and grid_adj are only built on first use, so sparse
+    large-grid labs never allocate them.
+    """
+
+    @classmethod
+    def of(cls, number_of_rooms):
+        topology = _topologies.get(number_of_rooms)
+        if topology is None:
+            topology = _topologies[number_of_rooms] = cls(number_of_rooms)
+        return topology
+
+    def __init__(self, number_of_rooms):
+        self.number_of_rooms = number_of_rooms
+        self.grid_size = int(np.sqrt(number_of_rooms))
+        assert self.grid_size ** 2 == number_of_rooms, "Number of rooms must be a perfect square for Grid World"
+        g, rooms = self.grid_size, number_of_rooms
+
+        # coords[room] = (r, c); coord_list holds the same as tuples for cheap unpacking in Python loops
+        self.coords = np.stack(np.divmod(np.arange(rooms), g), axis=1)
+        self.coord_list = [tuple(int(v) for v in rc) for rc in self.coords]
+
+        # Door slots between Right and Down neighbours: bit e of an edge bitset is edges[e]
+        edges = []
+        for r in range(g):
+            for c in range(g):
+                room = r * g + c
+                if c + 1 < g:
+                    edges.append((room, room + 1))
+                if r + 1 < g:
+                    edges.append((room, room + g))
+        self.edges = np.array(edges, dtype=int).reshape(-1, 2)
+        self.number_of_edges = len(self.edges)
+
+        # neighbors[room, d] / neighbor_edges[room, d] in direction d, -1 outside the grid
+        self.neighbors = np.full((rooms, 4), -1, dtype=int)
+        self.neighbor_edges = np.full((rooms, 4), -1, dtype=int)
+        for e, (a, b) in enumerate(self.edges):
+            forward, backward = (0, 2) if b == a + 1 else (3, 1)
+            self.neighbors[a, forward], self.neighbor_edges[a, forward] = b, e
+            self.neighbors[b, backward], self.neighbor_edges[b, backward] = a, e
+        # moves[room]: (direction, neighbour, edge) of every grid neighbour, for Python loops
+        self.moves = [
+            [(d, int(self.neighbors[room, d]), int(self.neighbor_edges[room, d])) for d in range(4) if self.neighbors[room, d] >= 0]
+            for room in range(rooms)
+        ]
+
+        # CNN spatial map (2 * grid_size + 1 square): room centres and the wall/door cell of every edge
+        self.spatial_size = 2 * g + 1
+        self.room_cells = 2 * self.coords + 1
+        self.edge_cells = self.room_cells[self.edges[:, 0]] + (self.room_cells[self.edges[:, 1]] - self.room_cells[self.edges[:, 0]]) // 2
+
+        self.symmetries, self.symmetry_directions = self._grid_symmetries()
+
+        self._edge_index = None
+        self._grid_adj = None
+        for array in (self.coords, self.edges, self.neighbors, self.neighbor_edges, self.room_cells,
+                      self.edge_cells, self.symmetries, self.symmetry_directions):
+            array.setflags(write=False)
+
+    @property
+    def edge_index(self):
+        # edge_index[a, b]: edge id between rooms a and b, -1 if they are not neighbours
+        if self._edge_index is None:
+            edge_index = np.full((self.number_of_rooms, self.number_of_rooms), -1, dtype=int)
+            edge_index[self.edges[:, 0], self.edges[:, 1]] = np.arange(self.number_of_edges)
+            edge_index[self.edges[:, 1], self.edges[:, 0]] = np.arange(self.number_of_edges)
+            edge_index.setflags(write=False)
+            self._edge_index = edge_index
+        return self._edge_index
+
+    @property
+    def grid_adj(self):
+        # Mask of all valid connections in the grid (neighbours and self loops)
+        if self._grid_adj is None:
+            adj = np.eye(self.number_of_rooms, dtype=int)
+            adj[self.edges[:, 0], self.edges[:, 1]] = 1
+            adj[self.edges[:, 1], self.edges[:, 0]] = 1
+            adj.setflags(write=False)
+            self._grid_adj = adj
+        return self._grid_adj
+
+    def _grid_symmetries(self):
+        """
+        The 8 rotations/reflections of the square grid as room permutations: symmetries[k, room] is
+        the room that `room` moves to. Symmetry 0 is the identity, 1-3 rotate by 90/180/270 degrees,
+        4-7 are the rotations followed by a left-right mirror.
+        symmetry_directions[k, d] is the direction action that action d (Right, Up, Left, Down) becomes.
+        """
+        rows, cols = self.coords[:, 0], self.coords[:, 1]
+        last = self.grid_size - 1
+        symmetries = np.zeros((8, self.number_of_rooms), dtype=int)
+        symmetry_directions = np.zeros((8, 4), dtype=int)
+        for k in range(8):
+            r, c = rows, cols
+            vectors = list(DIRECTIONS)
+            for _ in range(k % 4):
+                # Clockwise quarter turn: (r, c) -> (c, last - r)
+                r, c = c, last - r
+                vectors = [(dc, -dr) for dr, dc in vectors]
+            if k >= 4:
+                c = last - c
+                vectors = [(dr, -dc) for dr, dc in vectors]
+            symmetries[k] = r * self.grid_size + c
+            symmetry_directions[k] = [DIRECTIONS.index(v) for v in vectors]
+        return symmetries, symmetry_directions
+
+    def coord_to_index(self, r, c):
+        return r * self.grid_size + c
+
+    def direction_between(self, room, other):
+        # Direction from `room` to the neighbouring room `other`, -1 if they are not neighbours
+        for d, neighbor, _ in self.moves[room]:
+            if neighbor == other:
+                return d
+        return -1
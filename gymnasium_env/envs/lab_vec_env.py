@@ -0,0 +1,276 @@
+import numpy as np
+from gymnasium import spaces
+from gymnasium.utils import seeding
+from stable_baselines3.common.vec_env import VecEnv
+from .lab_generator import LabGenerator
+from .maze_dataset import MazeDataset
+from .seed_sampler import make_seed_sampler
+from .lab_env_cnn import encode_static_batch, encode_cnn_batch
+
+# Same action layout as LabEnv: 0 Right, 1 Up, 2 Left, 3 Down, 4 Backtrack, 5+ Buttons
+MOVE_DR = np.array([0, -1, 0, 1])
+MOVE_DC = np.array([1, 0, -1, 0])
+
+
+class LabVecEnv(VecEnv):
+    """
+    Batched version of LabEnv. All labs are held as stacked arrays (struct of arrays)
+    so that moves, button presses, goal checks, truncation, autoreset and action masks
+    are computed for every env with a handful of NumPy calls instead of one Python
+    LabEnv.step per env.
+    Implements the SB3 VecEnv interface, including action_masks for MaskablePPO / RecurrentMaskablePPO.
+    obs_mode "dict" gives LabEnv's dict observations, "cnn" the LabEnvCNN spatial tensors, encoded for
+    all envs at once into one (num_envs, channels, spatial, spatial) array.
+    """
+
+    def __init__(self, num_envs=16, number_of_rooms=4, valid_seeds=None, max_rooms=None, seed=None,
+                 difficulty=None, difficulty_weights=None, obs_mode="dict"):
+        assert obs_mode in ("dict", "cnn"), f"Unknown obs_mode {obs_mode}"
+        self.obs_mode = obs_mode
+        self.num_rooms = number_of_rooms
+        self.max_rooms = max_rooms if max_rooms is not None else number_of_rooms
+        self.render_mode = None
+
+        # rewards (identical to LabEnv)
+        self.reward_step = -0.1
+        self.reward_goal = 10.0
+        self.reward_invalid = -0.5
+        self.reward_out_of_range = -2
+        self.max_steps = 100
+
+        # seeds and difficulty settings, shared sampler for all slots (see seed_sampler.make_seed_sampler)
+        self.valid_seeds = valid_seeds
+        self.difficulty = difficulty
+        self.difficulty_weights = difficulty_weights
+
+        self._setup_size(number_of_rooms)
+        self.seed_sampler = make_seed_sampler(valid_seeds, self.dataset, difficulty, difficulty_weights)
+
+        super().__init__(num_envs, self._build_observation_space(), spaces.Discrete(5 + self.max_rooms))
+
+        # One rng per slot, seeded like make_env does it (seed + rank)
+        self._np_randoms = [seeding.np_random(None if seed is None else seed + i)[0] for i in range(num_envs)]
+        self._allocate()
+        self._actions = None
+
+    def _setup_size(self, number_of_rooms):
+        self.num_rooms = number_of_rooms
+        self.lab = LabGenerator(number_of_rooms=self.num_rooms)
+        self.grid_size = self.lab.grid_size
+        self.number_of_buttons = self.lab.number_of_buttons
+        # Memory-mapped dataset, shared by every slot
+        self.dataset = MazeDataset.open(self.num_rooms)
+
+    def _build_observation_space(self):
+        if self.obs_mode == "cnn":
+            size = self.lab.topology.spatial_size
+            return spaces.Box(low=0, high=1, shape=(4 + 2 * self.number_of_buttons, size, size), dtype=np.float32)
+        return spaces.Dict({
+            "agent_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "goal_location": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "door_states": spaces.Box(0, 1, shape=(self.num_rooms, self.num_rooms), dtype=int),
+            "button_locations": spaces.Box(0, 1, shape=(self.num_rooms, self.number_of_buttons), dtype=int),
+            "last_pos": spaces.Box(0, self.grid_size - 1, shape=(2,), dtype=int),
+            "button_door_behavior": spaces.Box(0, 1, shape=(self.number_of_buttons, self.num_rooms, self.num_rooms), dtype=int),
+        })
+
+    def _allocate(self):
+        n, rooms, buttons = self.num_envs, self.num_rooms, self.number_of_buttons
+        self.env_idx = np.arange(n)
+        self.agent_room = np.zeros(n, dtype=np.int64)
+        self.last_room = np.zeros(n, dtype=np.int64)
+        self.goal_room = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.room_trans_matrix = np.zeros((n, rooms, rooms), dtype=int)
+        self.door_state_matrix = np.zeros((n, rooms, rooms), dtype=int)
+        self.button_location_matrix = np.zeros((n, rooms, buttons), dtype=int)
+        self.button2door_behavior_matrix = np.zeros((n, buttons, rooms, rooms), dtype=int)
+        if self.obs_mode == "cnn":
+            # Static CNN channels per slot, rebuilt when the slot starts an episode
+            size = self.lab.topology.spatial_size
+            self.cnn_static = np.zeros((n, 4 + 2 * buttons, size, size), dtype=np.float32)
+
+    def _reset_slot(self, i):
+        if self.seed_sampler is not None:
+            lab_seed = self.seed_sampler.sample(self._np_randoms[i])
+        else:
+            lab_seed = int(self._np_randoms[i].integers(0, 2**31 - 1))
+
+        idx = self.dataset.index_of(lab_seed) if self.dataset is not None else -1
+        if idx >= 0:
+            start_room = self.dataset.get("start_room", idx)
+            self.goal_room[i] = self.dataset.get("goal_room", idx)
+            self.room_trans_matrix[i] = self.dataset.get("room_trans_matrix", idx)
+            self.door_state_matrix[i] = self.dataset.get("door_state_matrix", idx)
+            self.button_location_matrix[i] = self.dataset.get("button_location_matrix", idx)
+            self.button2door_behavior_matrix[i] = self.dataset.get("button2door_behavior_matrix", idx)
+        else:
+            self.lab.generate_lab(seed=lab_seed)
+            start_room = self.lab.start_room
+            self.goal_room[i] = self.lab.goal_room
+            self.room_trans_matrix[i] = self.lab.room_trans_matrix
+            self.door_state_matrix[i] = self.lab.door_state_matrix
+            self.button_location_matrix[i] = self.lab.button_location_matrix
+            self.button2door_behavior_matrix[i] = self.lab.button2door_behavior_matrix
+
+        # LabEnv starts with last_pos == agent_location
+        self.agent_room[i] = start_room
+        self.last_room[i] = start_room
+        self.steps[i] = 0
+        if self.obs_mode == "cnn":
+            slot = slice(i, i + 1)
+            encode_static_batch(self.lab.topology, self.goal_room[slot], self.room_trans_matrix[slot],
+                                self.button_location_matrix[slot], self.button2door_behavior_matrix[slot],
+                                out=self.cnn_static[slot])
+
+    def _get_obs(self, indices=None):
+        if indices is None:
+            indices = self.env_idx
+        if self.obs_mode == "cnn":
+            return encode_cnn_batch(self.lab.topology, self.cnn_static[indices], self.agent_room[indices],
+                                    self.room_trans_matrix[indices], self.door_state_matrix[indices])
+        agent = self.agent_room[indices]
+        last = self.last_room[indices]
+        goal = self.goal_room[indices]
+        g = self.grid_size
+        return {
+            "agent_location": np.stack([agent // g, agent % g], axis=1),
+            "goal_location": np.stack([goal // g, goal % g], axis=1),
+            "door_states": self.door_state_matrix[indices],
+            "button_locations": self.button_location_matrix[indices],
+            "last_pos": np.stack([last // g, last % g], axis=1),
+            "button_door_behavior": self.button2door_behavior_matrix[indices],
+        }
+
+    def reset(self):
+        for i in range(self.num_envs):
+            if self._seeds[i] is not None:
+                self._np_randoms[i] = seeding.np_random(self._seeds[i])[0]
+            self._reset_slot(i)
+        self._reset_seeds()
+        self._reset_options()
+        return self._get_obs()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self._actions
+        n, g = self.num_envs, self.grid_size
+        env_idx = self.env_idx
+        rewards = np.full(n, self.reward_step, dtype=np.float32)
+        self.steps += 1
+
+        cur = self.agent_room
+        cur_r, cur_c = cur // g, cur % g
+
+        # 1. Moves (0-3) and Backtrack (4)
+        is_move = actions < 4
+        is_backtrack = actions == 4
+        direction = np.clip(actions, 0, 3)
+        new_r = cur_r + MOVE_DR[direction]
+        new_c = cur_c + MOVE_DC[direction]
+        in_bounds = (new_r >= 0) & (new_r < g) & (new_c >= 0) & (new_c < g)
+        target = np.where(in_bounds, new_r * g + new_c, cur)
+        target = np.where(is_backtrack, self.last_room, target)
+
+        is_open = self.door_state_matrix[env_idx, cur, target] == 1
+        moved = (is_move & in_bounds & is_open) | is_backtrack
+        blocked = is_move & in_bounds & ~is_open
+        rewards[blocked] = self.reward_invalid
+
+        self.last_room = np.where(moved, cur, self.last_room)
+        self.agent_room = np.where(moved, target, cur)
+        terminated = moved & (target == self.goal_room)
+        rewards[terminated] = self.reward_goal
+
+        # 2. Buttons (5+)
+        btn = actions - 5
+        is_button = actions >= 5
+        btn_exists = is_button & (btn < self.number_of_buttons)
+        btn_safe = np.clip(btn, 0, self.number_of_buttons - 1)
+        has_button = btn_exists & (self.button_location_matrix[env_idx, cur, btn_safe] == 1)
+        rewards[btn_exists & ~has_button] = self.reward_invalid
+        rewards[is_button & ~btn_exists] = self.reward_out_of_range
+
+        pressed = np.flatnonzero(has_button)
+        if pressed.size:
+            behavior = self.button2door_behavior_matrix[pressed, btn[pressed]]
+            # XOR current states with behavior, walls stay walls
+            self.door_state_matrix[pressed] = (self.door_state_matrix[pressed] ^ behavior) * self.room_trans_matrix[pressed]
+
+        truncated = self.steps > self.max_steps
+        dones = terminated | truncated
+
+        infos = [{} for _ in range(n)]
+        done_idx = np.flatnonzero(dones)
+        if done_idx.size:
+            terminal_obs = self._get_obs(done_idx)
+            for j, i in enumerate(done_idx):
+                if self.obs_mode == "cnn":
+                    infos[i]["terminal_observation"] = terminal_obs[j]
+                else:
+                    infos[i]["terminal_observation"] = {k: v[j] for k, v in terminal_obs.items()}
+                infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+                self._reset_slot(i)
+
+        return self._get_obs(), rewards, dones, infos
+
+    def action_masks(self):
+        n, g = self.num_envs, self.grid_size
+        mask = np.zeros((n, 5 + self.max_rooms), dtype=np.int8)
+        cur = self.agent_room
+        cur_r, cur_c = cur // g, cur % g
+
+        # 1. Check Moves (Right, Up, Left, Down)
+        for i in range(4):
+            new_r, new_c = cur_r + MOVE_DR[i], cur_c + MOVE_DC[i]
+            in_bounds = (new_r >= 0) & (new_r < g) & (new_c >= 0) & (new_c < g)
+            target = np.where(in_bounds, new_r * g + new_c, cur)
+            mask[:, i] = in_bounds & (self.door_state_matrix[self.env_idx, cur, target] == 1)
+
+        # 2. Check Backtrack (Action 4), last_pos is always set in LabEnv
+        mask[:, 4] = 1
+
+        # 3. Check Buttons
+        mask[:, 5:5 + self.number_of_buttons] = self.button_location_matrix[self.env_idx, cur]
+        return mask
+
+    def set_curriculum_stage(self, number_of_rooms):
+        if number_of_rooms > self.max_rooms:
+            raise ValueError(f"Curriculum room size {number_of_rooms} exceeds configured max_rooms={self.max_rooms}")
+        # Array shapes depend on the room count, so every slot starts a new episode at the new size
+        self._setup_size(number_of_rooms)
+        # Unique-seed and difficulty samplers draw from the dataset of the new size
+        self.seed_sampler = make_seed_sampler(self.valid_seeds, self.dataset, self.difficulty, self.difficulty_weights)
+        self.observation_space = self._build_observation_space()
+        self._allocate()
+        for i in range(self.num_envs):
+            self._reset_slot(i)
+
+    def set_difficulty(self, difficulty=None, difficulty_weights=None):
+        # Takes effect as slots finish their current episode
+        self.difficulty = difficulty
+        self.difficulty_weights = difficulty_weights
+        self.seed_sampler = make_seed_sampler(self.valid_seeds, self.dataset, difficulty, difficulty_weights)
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        # All slots share the vec env attributes
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = list(self._get_indices(indices))
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        # Batched results (e.g. action_masks) are split per env, everything else is broadcast
+        if isinstance(result, np.ndarray) and result.ndim > 0 and result.shape[0] == self.num_envs:
+            return [result[i] for i in indices]
+        return [result for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
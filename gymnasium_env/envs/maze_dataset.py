@@ -0,0 +1,452 @@
+import json
+import os
+import numpy as np
+
+from .seed_sampler import BucketSeedSampler
+
+DEFAULT_DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "datasets"))
+# Version 2 may leave out the seed runs (see SEED_RUNS_MAX_FRACTION), version 1 datasets still load
+FORMAT_VERSION = 2
+READABLE_FORMAT_VERSIONS = (1, 2)
+HEADER_FILE = "header.json"
+MANIFEST_FILE = "manifest.json"
+# Prebuilt difficulty bucket index files (see MazeDataset.difficulty_index)
+DIFFICULTY_INDEX_FILES = ["difficulty_buckets", "difficulty_offsets", "difficulty_seeds"]
+# Sorted seeds of the first lab of every symmetry class (see MazeDataset.unique_seeds)
+UNIQUE_SEEDS_FILE = "unique_seeds"
+# Sorted seeds of a multi-shard dataset and the row of each, written when the header has no seed runs
+SEED_INDEX_FILES = ["seed_index", "seed_index_rows"]
+# Seed runs are only kept in the header while there are at most this many per row: a JSON run costs
+# more than a few rows of the .npy seed column, scattered seeds are looked up in the column instead
+SEED_RUNS_MAX_FRACTION = 1 / 8
+
+# Per-lab fields stored in a dataset and the compact dtype they are written with
+LAB_FIELDS = {
+    "start_room": np.int32,
+    "goal_room": np.int32,
+    "room_trans_matrix": np.uint8,
+    "door_state_matrix": np.uint8,
+    "button_location_matrix": np.uint8,
+    "button2door_behavior_matrix": np.uint8,
+}
+
+# Optional per-lab oracle tables (see gymnasium_env.solver.oracle), shape (rooms, button_masks, 5)
+ORACLE_FIELDS = {
+    "oracle_distance": np.uint8,
+    "oracle_actions": np.uint16,
+}
+
+# Optional per-lab difficulty features (see gymnasium_env.solver.difficulty), in bucket key order
+DIFFICULTY_FIELDS = {
+    "solution_length": np.uint8,
+    "button_presses": np.uint8,
+    "distinct_buttons": np.uint8,
+    "backtrack_required": np.uint8,
+}
+
+# Optional symmetry class of every lab (see LabGenerator.canonical_batch)
+CANONICAL_FIELDS = {
+    "canonical_hash": np.uint64,
+}
+
+# Datasets already opened in this process, shared by every env instance
+_open_datasets = {}
+
+
+def dataset_path(num_rooms, base_dir=None):
+    return os.path.join(base_dir or DEFAULT_DATASET_DIR, f"mazes_{num_rooms}")
+
+
+class MazeDataset:
+    """
+    Precalculated labs stored as one uncompressed .npy file per field plus a header.json (a shard).
+    A dataset is either a single shard directory or a directory whose manifest.json lists shards.
+    Fields are opened with mmap_mode="r", so every env instance and subprocess worker on the
+    host shares the OS page cache instead of holding its own copy; a shard is only opened when
+    one of its rows is first accessed.
+    Seeds are stored sorted; the header describes them as contiguous runs so that a seed
+    lookup is a binary search over a handful of runs plus an offset (no seed -> row dict).
+    Scattered seeds would need about one run per row, then the header has no runs and a lookup is a
+    binary search over the memory-mapped seed column (or the SEED_INDEX_FILES of a manifest).
+    """
+
+    def __init__(self, header, shard_paths=None, shard_arrays=None, path=None):
+        self.header = header
+        self.path = path
+        self.num_rooms = header["num_rooms"]
+        self.count = header["count"]
+        self.fields = header["fields"]
+
+        shards = header.get("shards", [{"count": self.count}])
+        self.shard_offsets = np.cumsum([0] + [shard["count"] for shard in shards])
+        self.shard_paths = shard_paths
+        self._shard_arrays = shard_arrays if shard_arrays is not None else [None] * len(shards)
+        self._difficulty_index = None
+        self._unique_seeds = None
+        self._seed_index = None
+
+        self.run_first_seed = self.run_first_row = self.run_length = None
+        if header["seed_runs"] is not None:
+            runs = np.array(header["seed_runs"], dtype=np.int64).reshape(-1, 3)
+            runs = runs[np.argsort(runs[:, 0], kind="stable")]
+            self.run_first_seed = runs[:, 0]
+            self.run_first_row = runs[:, 1]
+            self.run_length = runs[:, 2]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, seed):
+        return self.index_of(seed) >= 0
+
+    @classmethod
+    def load(cls, path):
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                header = json.load(f)
+            shard_paths = [os.path.join(path, shard["path"]) for shard in header["shards"]]
+        else:
+            with open(os.path.join(path, HEADER_FILE)) as f:
+                header = json.load(f)
+            shard_paths = [path]
+        if header.get("format_version") not in READABLE_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported dataset format {header.get('format_version')} in {path}")
+        return cls(header, shard_paths=shard_paths, path=path)
+
+    @classmethod
+    def open(cls, num_rooms, base_dir=None):
+        """
+        Returns the dataset for `num_rooms` (cached per process) or None if there is none.
+        Falls back to a legacy mazes_{n}.npz, which is loaded into RAM and should be converted.
+        """
+        path = dataset_path(num_rooms, base_dir)
+        if path in _open_datasets:
+            return _open_datasets[path]
+
+        dataset = None
+        legacy_path = path + ".npz"
+        try:
+            if os.path.exists(os.path.join(path, MANIFEST_FILE)) or os.path.exists(os.path.join(path, HEADER_FILE)):
+                dataset = cls.load(path)
+            elif os.path.exists(legacy_path):
+                print(f"[MazeDataset] Loading legacy {legacy_path} into memory, "
+                      f"convert it with: python scripts/generate_mazes.py --convert")
+                with np.load(legacy_path) as data:
+                    arrays = {k: v for k, v in data.items()}
+                dataset = cls.from_arrays(arrays, num_rooms)
+        except Exception as e:
+            print(f"[MazeDataset] Failed to parse dataset {path}: {e}")
+            dataset = None
+
+        _open_datasets[path] = dataset
+        return dataset
+
+    @classmethod
+    def from_arrays(cls, arrays, num_rooms):
+        # In-memory single shard dataset with the same indexing as the on-disk format
+        arrays, header = _sorted_arrays_and_header(arrays, num_rooms)
+        return cls(header, shard_arrays=[arrays])
+
+    def index_of(self, seed):
+        # Row of `seed` or -1 when the seed is not in the dataset
+        if self.run_first_seed is None:
+            seeds, rows = self.seed_index()
+            i = int(np.searchsorted(seeds, seed))
+            if i == len(seeds) or seeds[i] != seed:
+                return -1
+            return i if rows is None else int(rows[i])
+        run = np.searchsorted(self.run_first_seed, seed, side="right") - 1
+        if run < 0:
+            return -1
+        offset = seed - self.run_first_seed[run]
+        if offset >= self.run_length[run]:
+            return -1
+        return int(self.run_first_row[run] + offset)
+
+    def seed_index(self):
+        """
+        (sorted seeds, row of each) for seed lookups without runs. A single shard is sorted by seed,
+        so its memory-mapped seed column is the index and rows is None (row i holds seeds[i]).
+        """
+        if self._seed_index is None:
+            if len(self._shard_arrays) == 1:
+                self._seed_index = (self._shard(0)["seeds"], None)
+            else:
+                self._seed_index = tuple(np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+                                         for name in SEED_INDEX_FILES)
+        return self._seed_index
+
+    def _shard(self, shard_id):
+        arrays = self._shard_arrays[shard_id]
+        if arrays is None:
+            path = self.shard_paths[shard_id]
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in ["seeds"] + list(self.fields)
+            }
+            self._shard_arrays[shard_id] = arrays
+        return arrays
+
+    def get(self, field, idx):
+        # Value of `field` in row `idx`
+        shard_id = int(np.searchsorted(self.shard_offsets, idx, side="right")) - 1
+        return self._shard(shard_id)[field][idx - self.shard_offsets[shard_id]]
+
+    def column(self, field):
+        # Whole column over all shards (a memory-mapped view for single shard datasets)
+        columns = [self._shard(shard_id)[field] for shard_id in range(len(self._shard_arrays))]
+        return columns[0] if len(columns) == 1 else np.concatenate(columns)
+
+    @property
+    def has_oracle(self):
+        return all(name in self.fields for name in ORACLE_FIELDS)
+
+    @property
+    def has_difficulty(self):
+        return all(name in self.fields for name in DIFFICULTY_FIELDS)
+
+    @property
+    def has_canonical(self):
+        return all(name in self.fields for name in CANONICAL_FIELDS)
+
+    def unique_seeds(self):
+        """
+        Sorted seeds with one representative (the smallest seed) per symmetry class, i.e. the labs
+        left after deduplication. All seeds if the dataset has no canonical hashes.
+        """
+        if self._unique_seeds is None:
+            path = os.path.join(self.path, f"{UNIQUE_SEEDS_FILE}.npy") if self.path else None
+            if path is not None and os.path.exists(path):
+                self._unique_seeds = np.load(path, mmap_mode="r")
+            elif self.has_canonical:
+                self._unique_seeds = first_of_class(self.column("seeds"), self.column("canonical_hash"))
+            else:
+                self._unique_seeds = self.column("seeds")
+        return self._unique_seeds
+
+    def difficulty_index(self):
+        """
+        Seeds grouped by difficulty: (buckets, offsets, seeds) where buckets[b] holds the
+        DIFFICULTY_FIELDS values of bucket b and seeds[offsets[b]:offsets[b + 1]] its sorted seeds.
+        Only the unique labs (see unique_seeds) are indexed. Loaded from the prebuilt files when
+        present, built from the feature columns otherwise.
+        """
+        if self._difficulty_index is None:
+            files = [os.path.join(self.path, f"{name}.npy") for name in DIFFICULTY_INDEX_FILES] if self.path else []
+            if files and all(os.path.exists(f) for f in files):
+                self._difficulty_index = tuple(np.load(f, mmap_mode="r") for f in files)
+            else:
+                self._difficulty_index = self._build_difficulty_index()
+        return self._difficulty_index
+
+    def difficulty_sampler(self, difficulty=None, weights=None, seed_range=None):
+        """
+        O(1) seed sampler over the labs matching `difficulty`, a dict mapping DIFFICULTY_FIELDS
+        to a value or an inclusive (min, max) range (None for an open end).
+        `weights` is an optional callable that gets the feature arrays of all buckets as a dict and
+        returns the sampling weight of a single lab in each bucket (e.g. lambda f: f["solution_length"]).
+        `seed_range` (start, stop) restricts sampling to those seeds, e.g. the training range.
+        """
+        buckets, offsets, seeds = self.difficulty_index()
+        features = {name: np.asarray(buckets[:, i], dtype=np.int64) for i, name in enumerate(DIFFICULTY_FIELDS)}
+
+        selected = np.ones(len(buckets), dtype=bool)
+        for name, condition in (difficulty or {}).items():
+            if name not in features:
+                raise ValueError(f"Unknown difficulty feature '{name}', expected one of {list(DIFFICULTY_FIELDS)}")
+            if isinstance(condition, (tuple, list)):
+                low, high = condition
+                if low is not None:
+                    selected &= features[name] >= low
+                if high is not None:
+                    selected &= features[name] <= high
+            else:
+                selected &= features[name] == condition
+
+        starts = np.array(offsets[:-1], dtype=np.int64)
+        stops = np.array(offsets[1:], dtype=np.int64)
+        if seed_range is not None:
+            # Seeds are sorted within each bucket, so the range is a sub-slice of every bucket
+            for b in np.flatnonzero(selected):
+                bucket_seeds = seeds[starts[b]:stops[b]]
+                lo, hi = np.searchsorted(bucket_seeds, seed_range)
+                starts[b], stops[b] = starts[b] + lo, starts[b] + hi
+
+        bucket_weights = selected.astype(np.float64)
+        if weights is not None:
+            bucket_weights *= np.asarray(weights(features), dtype=np.float64)
+        return BucketSeedSampler(seeds, starts, stops, bucket_weights)
+
+    def _build_difficulty_index(self):
+        seeds = self.column("seeds")
+        unique = np.isin(seeds, self.unique_seeds()) if self.has_canonical else slice(None)
+        features = {name: self.column(name)[unique] for name in DIFFICULTY_FIELDS}
+        return build_difficulty_index(seeds[unique], features)
+
+    def load_into(self, lab, idx):
+        # Copy row `idx` into a LabGenerator (copies keep the env free to mutate its lab)
+        lab.start_room = int(self.get("start_room", idx))
+        lab.goal_room = int(self.get("goal_room", idx))
+        lab.room_trans_matrix = np.array(self.get("room_trans_matrix", idx), dtype=int)
+        lab.door_state_matrix = np.array(self.get("door_state_matrix", idx), dtype=int)
+        lab.button_location_matrix = np.array(self.get("button_location_matrix", idx), dtype=int)
+        lab.button2door_behavior_matrix = np.array(self.get("button2door_behavior_matrix", idx), dtype=int)
+
+    @staticmethod
+    def write(path, arrays, num_rooms):
+        """
+        Writes `arrays` (dict with "seeds", the LAB_FIELDS and optionally the ORACLE_FIELDS,
+        one row per lab) to `path` as a single shard in the memory-mappable format.
+        """
+        arrays, header = _sorted_arrays_and_header(arrays, num_rooms)
+        os.makedirs(path, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        # Header is written last so an interrupted write is never picked up as a valid shard
+        _write_json(os.path.join(path, HEADER_FILE), header)
+        return path
+
+    @staticmethod
+    def read_shard_header(path):
+        # Header of a completely written shard, None if it is missing or unfinished
+        header_path = os.path.join(path, HEADER_FILE)
+        if not os.path.exists(header_path):
+            return None
+        with open(header_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_manifest(path, shard_names, num_rooms):
+        """
+        Combines the finished shards `shard_names` (subdirectories of `path`) into a manifest.json,
+        after which the whole directory opens with MazeDataset.load(path).
+        """
+        shards, seed_runs, fields = [], [], None
+        row_offset = 0
+        for name in shard_names:
+            header = MazeDataset.read_shard_header(os.path.join(path, name))
+            if header is None:
+                raise ValueError(f"Shard {name} in {path} is not complete")
+            fields = fields or header["fields"]
+            shards.append({"path": name, "count": header["count"]})
+            if seed_runs is not None and header["seed_runs"] is not None:
+                seed_runs += [[first_seed, row_offset + first_row, length]
+                              for first_seed, first_row, length in header["seed_runs"]]
+            else:
+                seed_runs = None
+            row_offset += header["count"]
+
+        if seed_runs is not None and len(seed_runs) > SEED_RUNS_MAX_FRACTION * row_offset:
+            seed_runs = None
+        if seed_runs is None and len(shard_names) > 1:
+            # Seeds of all shards sorted, next to the row they are stored in
+            seeds = np.concatenate([np.load(os.path.join(path, name, "seeds.npy"), mmap_mode="r") for name in shard_names])
+            order = np.argsort(seeds, kind="stable")
+            for name, values in zip(SEED_INDEX_FILES, (seeds[order], order.astype(np.int64))):
+                np.save(os.path.join(path, f"{name}.npy"), values)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "num_rooms": int(num_rooms),
+            "count": int(row_offset),
+            "fields": fields or {},
+            "seed_runs": seed_runs,
+            "shards": shards,
+        }
+        _write_json(os.path.join(path, MANIFEST_FILE), manifest)
+        return manifest
+
+    @staticmethod
+    def write_difficulty_index(path):
+        # Prebuilds the difficulty bucket index of the dataset at `path` (no-op without difficulty columns)
+        dataset = MazeDataset.load(path)
+        if not dataset.has_difficulty:
+            return False
+        index = dataset._build_difficulty_index()
+        for name, values in zip(DIFFICULTY_INDEX_FILES, index):
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        return True
+
+    @staticmethod
+    def write_unique_seeds(path):
+        """
+        Dedup pass: writes the seeds of the first lab of every symmetry class of the dataset at `path`.
+        Returns (unique labs, total labs), or None without canonical hashes.
+        """
+        dataset = MazeDataset.load(path)
+        if not dataset.has_canonical:
+            return None
+        unique_seeds = first_of_class(dataset.column("seeds"), dataset.column("canonical_hash"))
+        np.save(os.path.join(path, f"{UNIQUE_SEEDS_FILE}.npy"), unique_seeds)
+        return len(unique_seeds), len(dataset)
+
+    @staticmethod
+    def convert_npz(npz_path, path=None):
+        # Converts a legacy mazes_{n}.npz next to it (or into `path`)
+        if path is None:
+            path = npz_path[:-len(".npz")] if npz_path.endswith(".npz") else npz_path + "_mmap"
+        with np.load(npz_path) as data:
+            arrays = {k: v for k, v in data.items()}
+        num_rooms = arrays["room_trans_matrix"].shape[1]
+        return MazeDataset.write(path, arrays, num_rooms)
+
+
+def first_of_class(seeds, canonical_hash):
+    # Sorted seeds of the first row of every canonical hash
+    _, first = np.unique(np.asarray(canonical_hash), return_index=True)
+    return np.sort(np.asarray(seeds, dtype=np.int64)[first])
+
+
+def build_difficulty_index(seeds, features):
+    # Groups seeds by their DIFFICULTY_FIELDS values, see MazeDataset.difficulty_index
+    keys = np.stack([np.asarray(features[name], dtype=np.uint8) for name in DIFFICULTY_FIELDS], axis=1)
+    buckets, bucket_of = np.unique(keys, axis=0, return_inverse=True)
+    bucket_of = bucket_of.reshape(-1)
+    order = np.lexsort((seeds, bucket_of))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(bucket_of, minlength=len(buckets)))]).astype(np.int64)
+    return buckets, offsets, np.asarray(seeds, dtype=np.int64)[order]
+
+
+def _write_json(path, content):
+    # Write-then-rename so readers never see a half written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(content, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _sorted_arrays_and_header(arrays, num_rooms):
+    seeds = np.asarray(arrays["seeds"], dtype=np.int64)
+    order = np.argsort(seeds, kind="stable")
+    if np.any(order != np.arange(len(seeds))):
+        seeds = seeds[order]
+        arrays = {k: np.asarray(v)[order] for k, v in arrays.items()}
+
+    sorted_arrays = {"seeds": seeds}
+    fields = {}
+    optional_fields = {name: dtype for name, dtype in {**ORACLE_FIELDS, **DIFFICULTY_FIELDS, **CANONICAL_FIELDS}.items() if name in arrays}
+    for name, dtype in {**LAB_FIELDS, **optional_fields}.items():
+        if name == "oracle_actions":
+            # Labs with more than 11 buttons need a wider action mask (see oracle.action_mask_dtype)
+            dtype = np.promote_types(dtype, np.asarray(arrays[name]).dtype)
+        sorted_arrays[name] = np.ascontiguousarray(arrays[name], dtype=dtype)
+        fields[name] = {"dtype": np.dtype(dtype).name, "shape": list(sorted_arrays[name].shape[1:])}
+
+    # Contiguous seed runs: [first_seed, first_row, length], None when the seeds are too scattered
+    breaks = np.flatnonzero(np.diff(seeds) != 1) + 1
+    seed_runs = None
+    if len(breaks) + 1 <= max(1, SEED_RUNS_MAX_FRACTION * len(seeds)):
+        starts = np.concatenate([[0], breaks]) if len(seeds) else np.array([], dtype=np.int64)
+        ends = np.concatenate([breaks, [len(seeds)]]) if len(seeds) else np.array([], dtype=np.int64)
+        seed_runs = [[int(seeds[s]), int(s), int(e - s)] for s, e in zip(starts, ends)]
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "num_rooms": int(num_rooms),
+        "count": int(len(seeds)),
+        "first_seed": int(seeds[0]) if len(seeds) else None,
+        "fields": fields,
+        "seed_runs": seed_runs,
+    }
+    return sorted_arrays, header
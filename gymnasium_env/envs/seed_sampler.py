@@ -0,0 +1,193 @@
+import numpy as np
+
+# Seed ranges used for training and evaluation labs
+TRAIN_SEEDS = range(0, 1000000)
+EVAL_SEEDS = range(10000000, 10001000)
+NAMED_SEEDS = {"train": TRAIN_SEEDS, "eval": EVAL_SEEDS, "eval_sequential": EVAL_SEEDS,
+               "train_unique": TRAIN_SEEDS, "eval_unique": EVAL_SEEDS}
+
+
+class SeedSampler:
+    """
+    Draws the lab seed for the next episode. All samplers are O(1) per draw and hold
+    no per-seed Python objects.
+    """
+
+    def sample(self, rng):
+        raise NotImplementedError()
+
+    def __len__(self):
+        raise NotImplementedError()
+
+
+class RangeSeedSampler(SeedSampler):
+    # Uniform over a contiguous range [start, stop), sampled arithmetically
+    def __init__(self, start, stop):
+        assert stop > start, "Seed range must not be empty"
+        self.start = int(start)
+        self.stop = int(stop)
+
+    def sample(self, rng):
+        # Same draw as rng.choice(list(range(start, stop))), so seed sequences are unchanged
+        return self.start + int(rng.integers(0, self.stop - self.start))
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+class ArraySeedSampler(SeedSampler):
+    # Uniform over an explicit seed array
+    def __init__(self, seeds):
+        self.seeds = np.asarray(seeds, dtype=np.int64)
+        assert self.seeds.ndim == 1 and len(self.seeds) > 0, "Seed array must be 1-D and not empty"
+
+    def sample(self, rng):
+        return int(self.seeds[rng.integers(0, len(self.seeds))])
+
+    def __len__(self):
+        return len(self.seeds)
+
+
+class WeightedSeedSampler(SeedSampler):
+    """
+    Samples seeds proportionally to `weights` with Vose's alias method:
+    O(n) table construction, O(1) per draw.
+    """
+
+    def __init__(self, seeds, weights):
+        self.seeds = np.asarray(seeds, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        assert self.seeds.shape == weights.shape, "seeds and weights must have the same shape"
+        assert np.all(weights >= 0) and weights.sum() > 0, "weights must be non-negative and not all zero"
+        self.prob, self.alias = self.build_alias_table(weights)
+
+    @staticmethod
+    def build_alias_table(weights):
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        prob = np.ones(n, dtype=np.float64)
+        alias = np.arange(n, dtype=np.int64)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = g
+            scaled[g] = scaled[g] + scaled[s] - 1.0
+            if scaled[g] < 1.0:
+                small.append(g)
+            else:
+                large.append(g)
+        # Leftovers are 1 up to floating point error
+        return prob, alias
+
+    def sample(self, rng):
+        i = int(rng.integers(0, len(self.seeds)))
+        if rng.random() < self.prob[i]:
+            return int(self.seeds[i])
+        return int(self.seeds[self.alias[i]])
+
+    def __len__(self):
+        return len(self.seeds)
+
+
+class BucketSeedSampler(SeedSampler):
+    """
+    Samples from slices [starts[b], stops[b]) of a seed array grouped into buckets (e.g. the
+    difficulty index of a MazeDataset): the bucket is drawn from an alias table weighted by
+    bucket_weights * bucket size, the seed uniformly within the bucket. O(1) per draw.
+    """
+
+    def __init__(self, seeds, starts, stops, bucket_weights=None):
+        self.seeds = seeds
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        sizes = stops - starts
+        weights = sizes if bucket_weights is None else np.asarray(bucket_weights, dtype=np.float64) * sizes
+        keep = (sizes > 0) & (weights > 0)
+        assert np.any(keep), "No seeds match the requested buckets"
+        self.starts = starts[keep]
+        self.sizes = sizes[keep]
+        self.prob, self.alias = WeightedSeedSampler.build_alias_table(np.asarray(weights[keep], dtype=np.float64))
+
+    def sample(self, rng):
+        b = int(rng.integers(0, len(self.starts)))
+        if rng.random() >= self.prob[b]:
+            b = int(self.alias[b])
+        return int(self.seeds[self.starts[b] + rng.integers(0, self.sizes[b])])
+
+    def __len__(self):
+        return int(self.sizes.sum())
+
+
+class SequentialSeedSampler(SeedSampler):
+    # Deterministic sweep over the seeds (e.g. for evaluation), wraps around at the end
+    def __init__(self, seeds):
+        if isinstance(seeds, range):
+            self.seeds = seeds
+        else:
+            self.seeds = np.asarray(seeds, dtype=np.int64)
+        assert len(self.seeds) > 0, "Seed sequence must not be empty"
+        self.position = 0
+
+    def sample(self, rng=None):
+        seed = int(self.seeds[self.position])
+        self.position = (self.position + 1) % len(self.seeds)
+        return seed
+
+    def __len__(self):
+        return len(self.seeds)
+
+
+def seed_range_of(valid_seeds):
+    # (start, stop) of a contiguous `valid_seeds` argument, None for "all seeds", error otherwise
+    if valid_seeds is None:
+        return None
+    if isinstance(valid_seeds, str):
+        valid_seeds = NAMED_SEEDS.get(valid_seeds)
+    if isinstance(valid_seeds, RangeSeedSampler):
+        return valid_seeds.start, valid_seeds.stop
+    if isinstance(valid_seeds, range) and valid_seeds.step == 1:
+        return valid_seeds.start, valid_seeds.stop
+    raise ValueError("Difficulty sampling only combines with contiguous valid_seeds ('train', 'eval' or a range)")
+
+
+def make_seed_sampler(valid_seeds, dataset=None, difficulty=None, difficulty_weights=None):
+    """
+    Turns the `valid_seeds` argument of the envs into a sampler (None means fully random seeds).
+    Accepts "train", "eval", "eval_sequential", a range, a seed list/array,
+    a (seeds, weights) tuple or a SeedSampler instance.
+    "train_unique" / "eval_unique" keep one lab per symmetry class (see MazeDataset.unique_seeds).
+    With a `difficulty` filter and/or `difficulty_weights` the seeds are drawn from the difficulty
+    buckets of `dataset` instead (see MazeDataset.difficulty_sampler).
+    """
+    if difficulty is not None or difficulty_weights is not None:
+        if dataset is None or not dataset.has_difficulty:
+            print("[SeedSampler] Dataset has no difficulty index, ignoring difficulty settings")
+        else:
+            return dataset.difficulty_sampler(difficulty, difficulty_weights, seed_range_of(valid_seeds))
+    if valid_seeds is None or isinstance(valid_seeds, SeedSampler):
+        return valid_seeds
+    if isinstance(valid_seeds, str):
+        if valid_seeds == "train":
+            return RangeSeedSampler(TRAIN_SEEDS.start, TRAIN_SEEDS.stop)
+        if valid_seeds == "eval":
+            return RangeSeedSampler(EVAL_SEEDS.start, EVAL_SEEDS.stop)
+        if valid_seeds == "eval_sequential":
+            return SequentialSeedSampler(EVAL_SEEDS)
+        if valid_seeds in ("train_unique", "eval_unique"):
+            seed_range = NAMED_SEEDS[valid_seeds]
+            if dataset is None:
+                print(f"[SeedSampler] No dataset to deduplicate '{valid_seeds}', using all seeds")
+                return RangeSeedSampler(seed_range.start, seed_range.stop)
+            unique_seeds = dataset.unique_seeds()
+            lo, hi = np.searchsorted(unique_seeds, [seed_range.start, seed_range.stop])
+            return ArraySeedSampler(unique_seeds[lo:hi])
+        raise ValueError(f"Unknown valid_seeds '{valid_seeds}'")
+    if isinstance(valid_seeds, range):
+        assert valid_seeds.step == 1, "Only contiguous seed ranges are supported"
+        return RangeSeedSampler(valid_seeds.start, valid_seeds.stop)
+    if isinstance(valid_seeds, tuple) and len(valid_seeds) == 2 and np.ndim(valid_seeds[0]) == 1:
+        return WeightedSeedSampler(*valid_seeds)
+    return ArraySeedSampler(valid_seeds)
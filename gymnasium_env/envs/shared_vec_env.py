@@ -0,0 +1,273 @@
+import multiprocessing as mp
+import os
+import numpy as np
+from gymnasium import spaces
+from multiprocessing.shared_memory import SharedMemory
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+
+
+def _obs_spaces(observation_space):
+    # (key, space) of every observation array, key None for a single Box observation
+    if isinstance(observation_space, spaces.Dict):
+        return list(observation_space.spaces.items())
+    return [(None, observation_space)]
+
+
+def _obs_name(prefix, key):
+    return prefix if key is None else f"{prefix}/{key}"
+
+
+def _layout(num_envs, observation_space, number_of_actions):
+    # (name, shape, dtype, offset) of every shared array, all in one shared memory block
+    fields = [
+        ("actions", (num_envs,), np.int64),
+        ("rewards", (num_envs,), np.float32),
+        ("dones", (num_envs,), np.bool_),
+        ("truncated", (num_envs,), np.bool_),
+        ("action_masks", (num_envs, number_of_actions), np.int8),
+    ]
+    for prefix in ("obs", "terminal_obs"):
+        for key, space in _obs_spaces(observation_space):
+            fields.append((_obs_name(prefix, key), (num_envs,) + space.shape, space.dtype))
+    layout, offset = [], 0
+    for name, shape, dtype in fields:
+        dtype = np.dtype(dtype)
+        layout.append((name, shape, dtype.str, offset))
+        # 8 byte alignment for every array
+        offset += (int(np.prod(shape)) * dtype.itemsize + 7) // 8 * 8
+    return layout, offset
+
+
+def _map_arrays(shm, layout):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, shape, dtype, offset in layout}
+
+
+def _write_obs(arrays, prefix, observation_space, i, obs):
+    for key, _ in _obs_spaces(observation_space):
+        arrays[_obs_name(prefix, key)][i] = obs if key is None else obs[key]
+
+
+def _worker(remote, parent_remote, env_fn_wrappers, start):
+    # Runs envs start .. start + len(env_fns) - 1 and writes their results into the shared arrays
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    envs = [_patch_env(env_fn()) for env_fn in env_fn_wrappers.var]
+    observation_space = envs[0].observation_space
+    shm, arrays, copy_masks = None, None, []
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                actions = arrays["actions"]
+                for j, env in enumerate(envs):
+                    i = start + j
+                    obs, reward, terminated, truncated, _ = env.step(int(actions[i]))
+                    done = terminated or truncated
+                    if done:
+                        # Final observation goes to terminal_obs, obs already holds the next episode
+                        _write_obs(arrays, "terminal_obs", observation_space, i, obs)
+                        obs, _ = env.reset()
+                    _write_obs(arrays, "obs", observation_space, i, obs)
+                    arrays["rewards"][i] = reward
+                    arrays["dones"][i] = done
+                    arrays["truncated"][i] = truncated and not terminated
+                    if copy_masks[j]:
+                        arrays["action_masks"][i] = env.get_wrapper_attr("action_masks")()
+                remote.send(None)
+            elif cmd == "reset":
+                seeds, options = data
+                for j, env in enumerate(envs):
+                    maybe_options = {"options": options[j]} if options[j] else {}
+                    obs, _ = env.reset(seed=seeds[j], **maybe_options)
+                    _write_obs(arrays, "obs", observation_space, start + j, obs)
+                    if copy_masks[j]:
+                        arrays["action_masks"][start + j] = env.get_wrapper_attr("action_masks")()
+                remote.send(None)
+            elif cmd == "attach":
+                shm = SharedMemory(name=data[0])
+                arrays = _map_arrays(shm, data[1])
+                copy_masks = []
+                for j, env in enumerate(envs):
+                    # LabEnv keeps its mask directly in the shared row, other envs are copied after each step
+                    try:
+                        env.get_wrapper_attr("set_mask_buffer")(arrays["action_masks"][start + j])
+                        copy_masks.append(False)
+                    except AttributeError:
+                        copy_masks.append(True)
+                remote.send(None)
+            elif cmd == "get_spaces":
+                remote.send((observation_space, envs[0].action_space))
+            elif cmd == "env_method":
+                name, args, kwargs, local = data
+                remote.send([envs[j].get_wrapper_attr(name)(*args, **kwargs) for j in local])
+            elif cmd == "get_attr":
+                name, local = data
+                remote.send([envs[j].get_wrapper_attr(name) for j in local])
+            elif cmd == "set_attr":
+                name, value, local = data
+                for j in local:
+                    setattr(envs[j], name, value)
+                remote.send(None)
+            elif cmd == "is_wrapped":
+                wrapper_class, local = data
+                remote.send([is_wrapped(envs[j], wrapper_class) for j in local])
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                arrays = None
+                if shm is not None:
+                    shm.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            break
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Process-based vec env whose observations, terminal observations, action masks, rewards and dones
+    live in one shared memory block. Every worker process steps a contiguous slice of the envs in place,
+    per step the parent only writes the actions and exchanges one empty message per worker.
+    Action masks are exposed as action_mask_array, which get_action_masks of RecurrentMaskablePPO reads
+    directly (LabEnvs write their row themselves, see LabEnv.set_mask_buffer).
+    Observations must keep the shapes of observation_space (one lab size per vec env). Step infos only
+    carry terminal_observation and TimeLimit.truncated, wrap it in VecMonitor for episode statistics.
+    """
+
+    def __init__(self, env_fns, num_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        num_envs = len(env_fns)
+        num_workers = min(num_envs, num_workers or os.cpu_count() or 1)
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # Contiguous env slices per worker
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.slices = [range(bounds[w], bounds[w + 1]) for w in range(num_workers)]
+        self.worker_of = np.repeat(np.arange(num_workers), np.diff(bounds))
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for work_remote, remote, env_slice in zip(self.work_remotes, self.remotes, self.slices):
+            args = (work_remote, remote, CloudpickleWrapper([env_fns[i] for i in env_slice]), env_slice.start)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        super().__init__(num_envs, observation_space, action_space)
+
+        layout, size = _layout(num_envs, observation_space, action_space.n)
+        self._shm = SharedMemory(create=True, size=size)
+        self._arrays = _map_arrays(self._shm, layout)
+        self._arrays["action_masks"][:] = 1
+        for remote in self.remotes:
+            remote.send(("attach", (self._shm.name, layout)))
+        for remote in self.remotes:
+            remote.recv()
+        self.action_mask_array = self._arrays["action_masks"]
+
+    def _obs(self, prefix, index=None):
+        # Copies, the shared arrays are overwritten by the next step
+        if isinstance(self.observation_space, spaces.Dict):
+            if index is None:
+                return {key: self._arrays[_obs_name(prefix, key)].copy() for key in self.observation_space.spaces}
+            return {key: self._arrays[_obs_name(prefix, key)][index].copy() for key in self.observation_space.spaces}
+        array = self._arrays[prefix]
+        return array.copy() if index is None else array[index].copy()
+
+    def reset(self):
+        for remote, env_slice in zip(self.remotes, self.slices):
+            remote.send(("reset", ([self._seeds[i] for i in env_slice], [self._options[i] for i in env_slice])))
+        for remote in self.remotes:
+            remote.recv()
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs("obs")
+
+    def step_async(self, actions):
+        self._arrays["actions"][:] = np.asarray(actions).reshape(self.num_envs)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+        dones = self._arrays["dones"].copy()
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = self._obs("terminal_obs", i)
+            infos[i]["TimeLimit.truncated"] = bool(self._arrays["truncated"][i])
+        return self._obs("obs"), self._arrays["rewards"].copy(), dones, infos
+
+    def action_masks(self):
+        return self.action_mask_array.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.action_mask_array = None
+        self._arrays = None
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def get_images(self):
+        return [None for _ in range(self.num_envs)]
+
+    def _by_worker(self, indices):
+        # {worker: ([position in indices], [local env index])} for the requested envs
+        targets = {}
+        for position, i in enumerate(self._get_indices(indices)):
+            worker = int(self.worker_of[i])
+            positions, local = targets.setdefault(worker, ([], []))
+            positions.append(position)
+            local.append(i - self.slices[worker].start)
+        return targets
+
+    def _call(self, cmd, indices, *data):
+        # Results in the order of `indices`, whichever workers they come from
+        targets = self._by_worker(indices)
+        for worker, (_, local) in targets.items():
+            self.remotes[worker].send((cmd, data + (local,)))
+        results = [None] * sum(len(positions) for positions, _ in targets.values())
+        for worker, (positions, _) in targets.items():
+            for position, result in zip(positions, self.remotes[worker].recv() or [None] * len(positions)):
+                results[position] = result
+        return results
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call("get_attr", indices, attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call("set_attr", indices, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call("env_method", indices, method_name, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._call("is_wrapped", indices, wrapper_class)
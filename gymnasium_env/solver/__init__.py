@@ -0,0 +1,7 @@
+from gymnasium_env.solver.state_space import LabStateSpace
+from gymnasium_env.solver.heuristics import HEURISTICS, PatternDatabase
+from gymnasium_env.solver.search import (AnytimeResult, SearchResult, anytime_search, env_state, search, solve,
+                                         solve_dataset)
+
+__all__ = ["AnytimeResult", "HEURISTICS", "LabStateSpace", "PatternDatabase", "SearchResult", "anytime_search", "env_state",
+           "search", "solve", "solve_dataset"]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from gymnasium_env.solver.oracle import UNREACHABLE, NO_LAST, OPPOSITE, compute_oracle_batch
+
+# Per-lab difficulty features, in bucket key order
+DIFFICULTY_FEATURES = ["solution_length", "button_presses", "distinct_buttons", "backtrack_required"]
+
+
+def compute_difficulty_batch(start_room, goal_room, room_trans_matrix, door_state_matrix, button_location_matrix,
+                             button2door_behavior_matrix, distance=None, optimal_actions=None):
+    """
+    Difficulty features of a batch of labs (dict of uint8 arrays keyed by DIFFICULTY_FEATURES):
+    - solution_length: optimal number of steps from the start (UNREACHABLE if unsolvable)
+    - button_presses / distinct_buttons: button presses and distinct buttons used by the optimal plan
+      that takes the lowest optimal action at every step (moves before Backtrack before buttons)
+    - backtrack_required: 1 if no plan of optimal length avoids Backtrack
+    `distance` / `optimal_actions` are the oracle tables if they are already computed.
+    """
+    lab = (goal_room, room_trans_matrix, door_state_matrix, button_location_matrix, button2door_behavior_matrix)
+    if distance is None or optimal_actions is None:
+        distance, optimal_actions = compute_oracle_batch(*lab)
+    start_room = np.asarray(start_room, dtype=np.int64).reshape(-1)
+    k, rooms = distance.shape[0], distance.shape[1]
+    batch = np.arange(k)
+    # Imported here: gymnasium_env.envs imports the solver
+    from gymnasium_env.envs.lab_topology import LabTopology
+    neighbors = LabTopology.of(rooms).neighbors
+
+    solution_length = distance[batch, start_room, 0, NO_LAST].astype(np.int64)
+    solvable = solution_length < UNREACHABLE
+
+    # Walk the plan for all labs at once
+    room = start_room.copy()
+    mask = np.zeros(k, dtype=np.int64)
+    last = np.full(k, NO_LAST, dtype=np.int64)
+    presses = np.zeros(k, dtype=np.int64)
+    used_buttons = np.zeros(k, dtype=np.int64)
+    for step in range(int(solution_length[solvable].max(initial=0))):
+        active = solvable & (step < solution_length)
+        bits = optimal_actions[batch, room, mask, last].astype(np.int64)
+        action = np.where(active, np.log2(np.maximum(bits & -bits, 1)).astype(np.int64), -1)
+
+        move = action < 4
+        direction = np.where(move, action, last)
+        travel = active & (action <= 4)
+        room = np.where(travel, neighbors[room, np.minimum(direction, 3)], room)
+        last = np.where(travel, OPPOSITE[np.minimum(direction, 3)], last)
+
+        press = active & (action >= 5)
+        button_bit = np.where(press, 1 << np.maximum(action - 5, 0), 0)
+        mask ^= button_bit
+        used_buttons |= button_bit
+        presses += press
+
+    no_backtrack_distance, _ = compute_oracle_batch(*lab, allow_backtrack=False)
+    backtrack_required = solvable & (no_backtrack_distance[batch, start_room, 0, NO_LAST] > solution_length)
+
+    distinct_buttons = np.zeros(k, dtype=np.int64)
+    for btn_idx in range(int(used_buttons.max(initial=0)).bit_length()):
+        distinct_buttons += (used_buttons >> btn_idx) & 1
+
+    return {
+        "solution_length": solution_length.astype(np.uint8),
+        "button_presses": presses.astype(np.uint8),
+        "distinct_buttons": distinct_buttons.astype(np.uint8),
+        "backtrack_required": backtrack_required.astype(np.uint8),
+    }
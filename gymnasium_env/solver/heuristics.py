@@ -0,0 +1,186 @@
+import numpy as np
+from collections import deque
+
+from gymnasium_env.solver.oracle import NO_LAST, OPPOSITE
+
+# A* heuristics: factories that take a LabStateSpace and return h(state) -> estimated steps to the goal,
+# None to prune a state that cannot reach it. All of them are admissible and consistent.
+
+
+def room_distance(space):
+    """
+    Distance of every room to the goal room (None if unreachable) over the doors that are open under at
+    least one button mask, in both directions since Backtrack returns through a door already used.
+    Every action changes the room by at most one such door, so it is an admissible and consistent heuristic.
+    """
+    rooms, num_masks, open_bits = space.number_of_rooms, space.num_masks, space.open_bits
+    adjacency = [0] * rooms
+    for room in range(rooms):
+        bits = 0
+        # Few distinct door sets per room: OR the distinct ones only
+        for mask_bits in set(open_bits[room * num_masks:(room + 1) * num_masks]):
+            bits |= mask_bits
+        adjacency[room] |= bits
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            adjacency[low.bit_length() - 1] |= 1 << room
+
+    distance = [None] * rooms
+    distance[space.goal_room] = 0
+    queue = deque([space.goal_room])
+    while queue:
+        room = queue.popleft()
+        bits = adjacency[room]
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            neighbor = low.bit_length() - 1
+            if distance[neighbor] is None:
+                distance[neighbor] = distance[room] + 1
+                queue.append(neighbor)
+    return distance
+
+
+def _per_room(space, distance):
+    states_per_room = space.num_masks * space.num_last
+    return lambda state: distance[state // states_per_room]
+
+
+def room_heuristic(space):
+    return _per_room(space, room_distance(space))
+
+
+def manhattan_heuristic(space):
+    # Grid distance to the goal, ignores walls and doors (the heuristic of the old evaluate_astar)
+    goal_r, goal_c = divmod(space.goal_room, space.grid_size)
+    distance = [abs(r - goal_r) + abs(c - goal_c) for r, c in (divmod(room, space.grid_size) for room in range(space.number_of_rooms))]
+    return _per_room(space, distance)
+
+
+def zero_heuristic(space):
+    # Uniform-cost search
+    return lambda state: 0
+
+
+def open_directions(space):
+    # open_dir[room, mask, direction]: the door to the grid neighbour is open under the button mask
+    rooms, num_masks = space.number_of_rooms, space.num_masks
+    # Imported here: gymnasium_env.envs imports the solver
+    from gymnasium_env.envs.lab_topology import LabTopology
+    neighbors = LabTopology.of(rooms).neighbors
+    if rooms <= 64:
+        bits = np.array(space.open_bits, dtype=np.uint64).reshape(rooms, num_masks, 1)
+        shifts = np.maximum(neighbors, 0).astype(np.uint64)[:, None, :]
+        open_dir = ((bits >> shifts) & np.uint64(1)).astype(bool)
+    else:
+        # Python ints as object array: bitsets wider than 64 rooms
+        bits = np.array(space.open_bits, dtype=object).reshape(rooms, num_masks, 1)
+        open_dir = ((bits >> np.maximum(neighbors, 0)[:, None, :]) & 1).astype(bool)
+    return open_dir & (neighbors >= 0)[:, None, :]
+
+
+class PatternDatabase:
+    """
+    Exact goal distances of an abstraction of the lab that only keeps the buttons in `pattern`:
+    abstract state (room, mask of the pattern buttons, direction of the last room or NO_LAST).
+    A door counts as open if it is open for some setting of the other buttons and pressing another
+    button does nothing, so every lab transition maps to an abstract transition (or a self loop) and the
+    abstract distances are an admissible, consistent heuristic that, unlike the room distance, knows which
+    doors need which of the pattern buttons. With all buttons in the pattern it is the exact distance.
+    Built by Bellman iteration backwards from the goal over rooms * 2^len(pattern) * 5 states, like the oracle.
+    """
+
+    def __init__(self, space, pattern, open_dir=None):
+        self.space = space
+        self.pattern = tuple(int(b) for b in pattern)
+        rooms, num_masks = space.number_of_rooms, space.num_masks
+        self.num_sub_masks = sub_masks = 1 << len(self.pattern)
+
+        # project[mask]: the pattern bits of a button mask, packed into len(pattern) bits
+        masks = np.arange(num_masks)
+        project = np.zeros(num_masks, dtype=np.int64)
+        for i, btn_idx in enumerate(self.pattern):
+            project |= ((masks >> btn_idx) & 1) << i
+        self.project = project.tolist()
+
+        from gymnasium_env.envs.lab_topology import LabTopology
+        neighbors = LabTopology.of(rooms).neighbors
+        valid_dir = neighbors >= 0
+        safe_neighbors = np.where(valid_dir, neighbors, np.arange(rooms)[:, None])
+        # Relaxed doors of every pattern mask: open under some mask that agrees on the pattern buttons
+        if open_dir is None:
+            open_dir = open_directions(space)
+        open_sub = np.stack([open_dir[:, project == sub_mask].any(axis=1) for sub_mask in range(sub_masks)], axis=-1)
+        has_button = np.array([[btn_idx in space.buttons_in_room[room] for btn_idx in self.pattern]
+                               for room in range(rooms)], dtype=bool).reshape(rooms, len(self.pattern))
+
+        # Step costs, inf where the action is not available
+        inf = np.iinfo(np.int32).max // 4
+        move_cost = np.where(open_sub, 1, inf).astype(np.int32)        # (room, dir, sub mask)
+        backtrack_cost = np.where(valid_dir, 1, inf).astype(np.int32)[:, :, None]          # (room, slot, 1)
+        button_cost = np.where(has_button, 1, inf).astype(np.int32)[:, :, None, None]     # (room, bit, 1, 1)
+        flipped = np.arange(sub_masks)[None, :] ^ (1 << np.arange(len(self.pattern)))[:, None]
+
+        distance = np.full((rooms, sub_masks, 5), inf, dtype=np.int32)
+        distance[space.goal_room] = 0
+        while True:
+            # Move or Backtrack towards direction d: (r, m, *) -> (neighbor(r, d), m, opposite(d))
+            next_dist = distance[safe_neighbors, :, OPPOSITE[None, :]]                     # (room, dir, sub mask)
+            new_distance = np.minimum(distance, (next_dist + move_cost).min(axis=1)[:, :, None])
+            new_distance[:, :, :4] = np.minimum(new_distance[:, :, :4], (next_dist + backtrack_cost).transpose(0, 2, 1))
+            if len(self.pattern):
+                # Pattern button: (r, m, l) -> (r, m ^ bit, l)
+                new_distance = np.minimum(new_distance, (distance[:, flipped] + button_cost).min(axis=1))
+            new_distance[space.goal_room] = 0
+            if np.array_equal(new_distance, distance):
+                break
+            distance = new_distance
+
+        self.distance = distance
+        self.table = [None if value >= inf else value for value in distance.reshape(-1).tolist()]
+
+    def heuristic(self):
+        space = self.space
+        table, project, sub_masks = self.table, self.project, self.num_sub_masks
+        num_last, num_masks, no_last, g = space.num_last, space.num_masks, space.no_last, space.grid_size
+        # Last-room slot by room difference: Right, Up, Left, Down
+        slot_of = {1: 0, -g: 1, -1: 2, g: 3}
+
+        def h(state):
+            room_mask, last = divmod(state, num_last)
+            room, mask = divmod(room_mask, num_masks)
+            slot = NO_LAST if last == no_last else slot_of.get(last - room, NO_LAST)
+            return table[(room * sub_masks + project[mask]) * 5 + slot]
+
+        return h
+
+
+def pattern_heuristic(space, pattern_size=4, patterns=None):
+    """
+    Maximum over pattern databases (the maximum of admissible heuristics is admissible), by default one
+    per group of `pattern_size` consecutive buttons. Labs with at most `pattern_size` buttons get the
+    exact distance, so A* only expands states on optimal plans.
+    """
+    if patterns is None:
+        buttons = list(range(space.number_of_buttons))
+        patterns = [buttons[i:i + pattern_size] for i in range(0, len(buttons), pattern_size)] or [[]]
+    open_dir = open_directions(space)
+    heuristics = [PatternDatabase(space, pattern, open_dir).heuristic() for pattern in patterns]
+    if len(heuristics) == 1:
+        return heuristics[0]
+
+    def h(state):
+        best = 0
+        for pattern_h in heuristics:
+            value = pattern_h(state)
+            if value is None:
+                return None
+            if value > best:
+                best = value
+        return best
+
+    return h
+
+
+HEURISTICS = {"room": room_heuristic, "manhattan": manhattan_heuristic, "pdb": pattern_heuristic, "none": zero_heuristic}
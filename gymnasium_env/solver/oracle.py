@@ -0,0 +1,166 @@
+import numpy as np
+
+# Distance value for states from which the goal cannot be reached (distances are stored as uint8)
+UNREACHABLE = 255
+# Bound on the (K, rooms, masks, 5, actions) action-value table of one pass, larger batches are split
+ORACLE_PASS_CELLS = 1 << 24
+# Last-room slot used when there is no last room (or it is the current room, where backtracking is a no-op)
+NO_LAST = 4
+# Direction pointing back: Right <-> Left, Up <-> Down
+OPPOSITE = np.array([2, 3, 0, 1])
+
+
+def last_direction(room, last_room, grid_size):
+    # Oracle last-room slot: direction from `room` to `last_room`, NO_LAST for none/self
+    if last_room is None or last_room < 0 or last_room == room:
+        return NO_LAST
+    diff = last_room - room
+    if diff == 1:
+        return 0
+    if diff == -grid_size:
+        return 1
+    if diff == -1:
+        return 2
+    return 3
+
+
+def action_mask_dtype(number_of_actions):
+    # Smallest unsigned dtype with one bit per LabEnv action (uint16 up to 11 buttons)
+    for dtype in (np.uint16, np.uint32, np.uint64):
+        if number_of_actions <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"{number_of_actions} actions do not fit a 64-bit action mask")
+
+
+def compute_oracle_batch(goal_room, room_trans_matrix, door_state_matrix, button_location_matrix,
+                         button2door_behavior_matrix, allow_backtrack=True):
+    """
+    Exact distance-to-goal and optimal action set for every state of a batch of labs, computed
+    backwards from the goal by Bellman iteration over all labs at once.
+    State tables have shape (K, rooms, button_mask, last_slot) where last_slot is the direction
+    of the last room (Right, Up, Left, Down) or NO_LAST.
+    With allow_backtrack=False the Backtrack action is left out (used to tell whether a lab needs it).
+    Returns (distance uint8 with UNREACHABLE, optimal_actions bitmask over LabEnv actions as
+    action_mask_dtype). Large batches are computed in passes of about ORACLE_PASS_CELLS action values.
+    """
+    goal_room = np.asarray(goal_room, dtype=np.int64).reshape(-1)
+    trans = np.asarray(room_trans_matrix).reshape(len(goal_room), *np.shape(room_trans_matrix)[-2:]) == 1
+    doors = np.asarray(door_state_matrix, dtype=np.int64).reshape(trans.shape)
+    has_button = np.asarray(button_location_matrix).reshape(len(goal_room), trans.shape[1], -1) == 1
+    behaviors = np.asarray(button2door_behavior_matrix, dtype=np.int64).reshape(len(goal_room), -1, *trans.shape[1:])
+
+    k, rooms = trans.shape[0], trans.shape[1]
+    buttons = behaviors.shape[1]
+    masks = 1 << buttons
+    actions = 5 + buttons
+    labs_per_pass = max(1, ORACLE_PASS_CELLS // (rooms * masks * 5 * actions))
+    if k > labs_per_pass:
+        passes = [
+            compute_oracle_batch(goal_room[i:i + labs_per_pass], trans[i:i + labs_per_pass], doors[i:i + labs_per_pass],
+                                 has_button[i:i + labs_per_pass], behaviors[i:i + labs_per_pass], allow_backtrack)
+            for i in range(0, k, labs_per_pass)
+        ]
+        return np.concatenate([p[0] for p in passes]), np.concatenate([p[1] for p in passes])
+
+    # Imported here: gymnasium_env.envs imports the solver
+    from gymnasium_env.envs.lab_topology import LabTopology
+    neighbors = LabTopology.of(rooms).neighbors
+    valid_dir = neighbors >= 0
+    safe_neighbors = np.where(valid_dir, neighbors, np.arange(rooms)[:, None])
+
+    # Door states for every button mask: open_doors[k, mask, room, neighbor]
+    open_doors = np.zeros((k, masks, rooms, rooms), dtype=bool)
+    open_doors[:, 0] = doors == 1
+    toggles = behaviors == 1
+    for mask in range(1, masks):
+        low_bit = (mask & -mask).bit_length() - 1
+        open_doors[:, mask] = open_doors[:, mask ^ (1 << low_bit)] ^ toggles[:, low_bit]
+    open_doors &= trans[:, None]
+    # move_open[k, room, mask, direction]
+    move_open = open_doors[:, :, np.arange(rooms)[:, None], safe_neighbors] & valid_dir
+    return _oracle_tables(goal_room, move_open.transpose(0, 2, 1, 3), has_button, neighbors, allow_backtrack)
+
+
+def compute_oracle_edges(goal_room, neighbor_edges, room_trans_edges, door_edges, button_location_matrix, button_edges,
+                         allow_backtrack=True):
+    """
+    compute_oracle_batch for one lab kept as per-edge arrays (sparse LabGenerator), without building
+    any (rooms, rooms) matrix: neighbor_edges[room, direction] is the edge to the grid neighbour (-1 outside).
+    Returns the (rooms, masks, 5) tables.
+    """
+    neighbor_edges = np.asarray(neighbor_edges)
+    toggles = np.asarray(button_edges) == 1
+    masks = 1 << len(toggles)
+    rooms = len(neighbor_edges)
+
+    # Edge states for every button mask: open_edges[mask, edge]
+    open_edges = np.zeros((masks, len(door_edges)), dtype=bool)
+    open_edges[0] = np.asarray(door_edges) == 1
+    for mask in range(1, masks):
+        low_bit = (mask & -mask).bit_length() - 1
+        open_edges[mask] = open_edges[mask ^ (1 << low_bit)] ^ toggles[low_bit]
+    open_edges &= np.asarray(room_trans_edges) == 1
+    # move_open[room, mask, direction]
+    move_open = (open_edges[:, np.maximum(neighbor_edges, 0)] & (neighbor_edges >= 0)).transpose(1, 0, 2)
+
+    has_button = np.asarray(button_location_matrix).reshape(rooms, -1) == 1
+    from gymnasium_env.envs.lab_topology import LabTopology
+    neighbors = LabTopology.of(rooms).neighbors
+    distance, optimal_actions = _oracle_tables(np.array([goal_room], dtype=np.int64), move_open[None], has_button[None],
+                                               neighbors, allow_backtrack)
+    return distance[0], optimal_actions[0]
+
+
+def _oracle_tables(goal_room, move_open, has_button, neighbors, allow_backtrack):
+    # Bellman iteration of compute_oracle_batch from move_open[k, room, mask, direction] and has_button[k, room, button]
+    k, rooms, masks = move_open.shape[:3]
+    buttons = has_button.shape[2]
+    actions = 5 + buttons
+    batch = np.arange(k)
+    inf = np.iinfo(np.int32).max // 2
+    valid_dir = neighbors >= 0
+    safe_neighbors = np.where(valid_dir, neighbors, np.arange(rooms)[:, None])
+
+    is_goal = np.zeros((k, rooms), dtype=bool)
+    is_goal[batch, goal_room] = True
+    distance = np.full((k, rooms, masks, 5), inf, dtype=np.int32)
+    distance[is_goal] = 0
+    mask_ids = np.arange(masks)
+
+    while True:
+        q = np.full((k, rooms, masks, 5, actions), inf, dtype=np.int32)
+        for d in range(4):
+            # Move: (r, m, *) -> (neighbor, m, opposite(d))
+            next_dist = distance[:, safe_neighbors[:, d]][..., OPPOSITE[d]] + 1
+            q[..., d] = np.where(move_open[..., d], next_dist, inf)[..., None]
+            # Backtrack from last slot d: (r, m, d) -> (neighbor, m, opposite(d))
+            if allow_backtrack:
+                q[:, :, :, d, 4] = np.where(valid_dir[:, d][None, :, None], next_dist, inf)
+        for btn_idx in range(buttons):
+            # Button: (r, m, l) -> (r, m ^ bit, l)
+            next_dist = distance[:, :, mask_ids ^ (1 << btn_idx), :] + 1
+            q[..., 5 + btn_idx] = np.where(has_button[:, :, btn_idx, None, None], next_dist, inf)
+
+        new_distance = np.minimum(q.min(axis=-1), inf)
+        new_distance[is_goal] = 0
+        if np.array_equal(new_distance, distance):
+            break
+        distance = new_distance
+
+    reachable = (distance < inf) & ~is_goal[:, :, None, None]
+    optimal = (q == distance[..., None]) & reachable[..., None]
+    dtype = action_mask_dtype(actions)
+    optimal_actions = (optimal * (np.ones(1, dtype=dtype) << np.arange(actions, dtype=dtype))).sum(axis=-1, dtype=dtype)
+    if np.any(distance[reachable] >= UNREACHABLE):
+        raise ValueError(f"Oracle distances of {UNREACHABLE} steps or more do not fit the uint8 distance tables")
+    distance = np.where(distance < UNREACHABLE, distance, UNREACHABLE).astype(np.uint8)
+    return distance, optimal_actions
+
+
+def compute_oracle(lab):
+    # Oracle tables of a single LabGenerator (shape (rooms, masks, 5))
+    distance, optimal_actions = compute_oracle_batch(
+        [lab.goal_room], lab.room_trans_matrix, lab.door_state_matrix,
+        lab.button_location_matrix, lab.button2door_behavior_matrix,
+    )
+    return distance[0], optimal_actions[0]
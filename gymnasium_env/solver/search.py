@@ -0,0 +1,169 @@
+import heapq
+import time
+from collections import deque, namedtuple
+
+from gymnasium_env.solver.heuristics import HEURISTICS
+from gymnasium_env.solver.state_space import LabStateSpace
+
+# actions: plan of LabEnv actions (None if the goal cannot be reached), expanded: states taken off the frontier,
+# timed_out: the search hit its deadline before finishing (actions is None then)
+SearchResult = namedtuple("SearchResult", ["actions", "expanded", "timed_out"], defaults=[False])
+# Best plan of an anytime search: optimal if it is proven shortest (actions None and optimal: unsolvable),
+# weight of the run that found it and seconds spent
+AnytimeResult = namedtuple("AnytimeResult", ["actions", "expanded", "optimal", "weight", "elapsed"])
+
+
+def _plan(parent, state):
+    # Follows the parent pointers {state: (previous_state, action)} back to the start
+    actions = []
+    step = parent[state]
+    while step is not None:
+        state, action = step
+        actions.append(action)
+        step = parent[state]
+    actions.reverse()
+    return actions
+
+
+def bfs(space, start_state=None):
+    """
+    Breadth-first search over the integer states of `space`, optimal since every action costs one step.
+    """
+    state = space.start_state() if start_state is None else start_state
+    states_per_room, goal = space.num_masks * space.num_last, space.goal_room
+    parent = {state: None}
+    queue = deque([state])
+    expanded = 0
+
+    while queue:
+        state = queue.popleft()
+        expanded += 1
+        if state // states_per_room == goal:
+            return SearchResult(_plan(parent, state), expanded)
+        for action, next_state in space.successors(state):
+            if next_state not in parent:
+                parent[next_state] = (state, action)
+                queue.append(next_state)
+
+    return SearchResult(None, expanded)
+
+
+def a_star(space, start_state=None, weight=1.0, heuristic="room", deadline=None, max_cost=None):
+    """
+    (Weighted) A* over the integer states of `space`, ordered by g + weight * h.
+    `heuristic` is a name of HEURISTICS ("room", "pdb", "manhattan", "none") or a function
+    h(state) returning the estimated steps to the goal or None to prune the state.
+    Optimal for weight 1 with an admissible heuristic, weight > 1 trades plan length for
+    fewer expansions (plans are at most `weight` times longer).
+    `deadline` (a time.perf_counter() value) stops the search with timed_out=True, `max_cost` prunes
+    states that cannot be on a plan shorter than `max_cost` steps.
+    """
+    if not callable(heuristic):
+        heuristic = HEURISTICS[heuristic or "room"](space)
+    states_per_room, goal = space.num_masks * space.num_last, space.goal_room
+
+    state = space.start_state() if start_state is None else start_state
+    h = heuristic(state)
+    if h is None or (max_cost is not None and h >= max_cost):
+        return SearchResult(None, 0)
+
+    # Frontier entries: (f, insertion order, g, state), parents are only stored once per improvement
+    frontier = [(weight * h, 0, 0, state)]
+    cost = {state: 0}
+    parent = {state: None}
+    counter = 1
+    expanded = 0
+
+    while frontier:
+        if deadline is not None and time.perf_counter() > deadline:
+            return SearchResult(None, expanded, True)
+        _, _, g, state = heapq.heappop(frontier)
+        if g > cost[state]:
+            # Stale entry, the state was pushed again with a lower cost
+            continue
+        expanded += 1
+        if state // states_per_room == goal:
+            return SearchResult(_plan(parent, state), expanded)
+
+        g += 1
+        for action, next_state in space.successors(state):
+            if next_state in cost and cost[next_state] <= g:
+                continue
+            h = heuristic(next_state)
+            if h is None or (max_cost is not None and g + h >= max_cost):
+                continue
+            cost[next_state] = g
+            parent[next_state] = (state, action)
+            heapq.heappush(frontier, (g + weight * h, counter, g, next_state))
+            counter += 1
+
+    return SearchResult(None, expanded)
+
+
+def weighted_a_star(space, start_state=None, weight=2.0, heuristic="room"):
+    return a_star(space, start_state=start_state, weight=weight, heuristic=heuristic)
+
+
+def anytime_search(space, start_state=None, budget=0.005, weights=(5.0, 3.0, 2.0, 1.5, 1.0), heuristic="room"):
+    """
+    Bounded-latency planning for live hints: weighted A* with decreasing weights until `budget` seconds
+    have passed, every run only looking for plans shorter than the best one so far. Returns the best plan
+    (None if nothing was found in time) as an AnytimeResult. The plan is proven optimal once a run with
+    weight 1 finishes, a run finishes without a shorter plan, or the plan is as short as h(start).
+    Building the heuristic counts against the budget, pass a prebuilt h(state) to query one lab repeatedly.
+    """
+    started = time.perf_counter()
+    deadline = started + budget
+    if not callable(heuristic):
+        heuristic = HEURISTICS[heuristic or "room"](space)
+    state = space.start_state() if start_state is None else start_state
+
+    lower_bound = heuristic(state)
+    best, best_weight, optimal, expanded = None, None, lower_bound is None, 0
+    for weight in ([] if optimal else weights):
+        result = a_star(space, state, weight, heuristic, deadline=deadline, max_cost=None if best is None else len(best))
+        expanded += result.expanded
+        if result.timed_out:
+            break
+        if result.actions is None:
+            # Nothing shorter than best (or no plan at all): best is optimal
+            optimal = True
+            break
+        best, best_weight = result.actions, weight
+        if weight <= 1.0 or len(best) <= lower_bound:
+            optimal = True
+            break
+    return AnytimeResult(best, expanded, optimal, best_weight, time.perf_counter() - started)
+
+
+SEARCHES = {"bfs": bfs, "astar": a_star, "weighted_astar": weighted_a_star, "anytime": anytime_search}
+
+
+def search(lab, method="astar", start_state=None, **kwargs):
+    """
+    Runs `method` ("bfs", "astar", "weighted_astar" or "anytime") on a LabGenerator (dense or sparse) or a
+    LabStateSpace and returns the SearchResult (AnytimeResult for "anytime"). kwargs (weight, heuristic,
+    budget) go to the searches, heuristic="pdb" uses pattern databases over the buttons.
+    """
+    space = lab if isinstance(lab, LabStateSpace) else LabStateSpace.from_generator(lab)
+    return SEARCHES[method](space, start_state=start_state, **kwargs)
+
+
+def solve(lab, method="astar", start_state=None, **kwargs):
+    """
+    Plan of LabEnv actions from the start of `lab` (LabGenerator or LabStateSpace) or from
+    `start_state` to the goal room, None if the lab cannot be solved.
+    """
+    return search(lab, method, start_state, **kwargs).actions
+
+
+def env_state(env):
+    # (LabStateSpace of the episode, integer state of the agent now) of a LabEnv, to plan mid-episode
+    space = env.state_space()
+    state = env.get_state()
+    return space, space.encode(state.agent_room, state.button_mask, state.last_room)
+
+
+def solve_dataset(dataset, idx, method="astar", **kwargs):
+    # Plan of lab `idx` of a MazeDataset, without building a LabGenerator
+    return solve(LabStateSpace.from_dataset(dataset, idx), method, **kwargs)
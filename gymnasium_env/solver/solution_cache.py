@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import numpy as np
+
+from gymnasium_env.envs.lab_prefetcher import DENSE_FIELDS, SPARSE_FIELDS
+from gymnasium_env.solver.search import env_state, solve
+
+DEFAULT_CACHE_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "datasets", "solutions.sqlite"))
+# Sources that decide which lab a seed generates, part of every cache key (generation rejection-samples
+# labs through LabStateSpace, so the state space is one of them)
+GENERATOR_SOURCES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "envs", "lab_generator.py"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "envs", "lab_topology.py"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_space.py"),
+]
+
+# Generator versions already hashed in this process, by (rooms, buttons, sparse)
+_versions = {}
+
+
+def generator_version(number_of_rooms, number_of_buttons, sparse=False):
+    """
+    Hash of the LabGenerator code and parameters: a cached plan is only used for a seed if the current
+    generator would build the same lab from it, so editing LabGenerator invalidates the cache by itself.
+    """
+    key = (number_of_rooms, number_of_buttons, bool(sparse))
+    version = _versions.get(key)
+    if version is None:
+        digest = hashlib.sha1(repr(key).encode())
+        for path in GENERATOR_SOURCES:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        version = _versions[key] = digest.hexdigest()
+    return version
+
+
+def lab_digest(lab):
+    # Hash of the fields of a LabGenerator (as generated, before any step), guards against labs loaded
+    # from a dataset built with another generator version
+    digest = hashlib.blake2b(digest_size=8)
+    for field in (SPARSE_FIELDS if lab.sparse else DENSE_FIELDS):
+        digest.update(np.ascontiguousarray(getattr(lab, field)).tobytes())
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """
+    Persistent sqlite table of optimal plans by (generator_version, seed), shared by the evaluation and
+    demonstration scripts. Rows also store the lab digest, a row whose lab differs from the requested one
+    is solved again and overwritten by the new plan. Unsolvable labs are stored with length -1.
+    New plans are written in batches of `flush_every`, call flush() or close() when done.
+    Several processes can share one file, sqlite serialises their writes.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, flush_every=1000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions ("
+            "version TEXT NOT NULL, seed INTEGER NOT NULL, digest TEXT NOT NULL, "
+            "length INTEGER NOT NULL, actions BLOB, PRIMARY KEY (version, seed))"
+        )
+        self.connection.commit()
+        # Plans not written yet: {(version, seed): (digest, actions)}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, seed, digest):
+        """
+        Returns (found, actions): actions is the cached plan, or None for a cached unsolvable lab.
+        """
+        entry = self.pending.get((version, seed))
+        if entry is None:
+            row = self.connection.execute(
+                "SELECT digest, length, actions FROM solutions WHERE version = ? AND seed = ?", (version, seed)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], None if row[1] < 0 else np.frombuffer(row[2], dtype=np.uint8).tolist())
+        if entry is None or entry[0] != digest:
+            return False, None
+        return True, entry[1]
+
+    def put(self, version, seed, digest, actions):
+        self.pending[(version, seed)] = (digest, actions)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows = [
+            (version, seed, digest, -1 if actions is None else len(actions),
+             None if actions is None else np.asarray(actions, dtype=np.uint8).tobytes())
+            for (version, seed), (digest, actions) in self.pending.items()
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)", rows)
+        self.pending.clear()
+
+    def solve_lab(self, lab, seed):
+        """
+        Plan of a LabGenerator freshly generated (or loaded) for `seed`, None if it is unsolvable.
+        Always solved with optimal A*: the key has no search settings, so every cached plan must be optimal.
+        """
+        version = generator_version(lab.number_of_rooms, lab.number_of_buttons, lab.sparse)
+        digest = lab_digest(lab)
+        found, actions = self.get(version, seed, digest)
+        if found:
+            self.hits += 1
+            return actions
+        self.misses += 1
+        actions = solve(lab)
+        self.put(version, seed, digest, actions)
+        return actions
+
+    def solve_env(self, env):
+        """
+        Plan from the current state of a LabEnv (unwrapped). Only the start of an episode is cached:
+        mid-episode states and augmented labs are solved directly.
+        """
+        space, state = env_state(env)
+        if env.lab_seed is None or env.augment or state != space.encode(space.start_room, 0, space.start_room):
+            return solve(space, start_state=state)
+        version = generator_version(env.lab.number_of_rooms, env.lab.number_of_buttons, env.lab.sparse)
+        digest = lab_digest(env.lab)
+        found, actions = self.get(version, env.lab_seed, digest)
+        if found:
+            self.hits += 1
+            return actions
+        self.misses += 1
+        actions = solve(space, start_state=state)
+        self.put(version, env.lab_seed, digest, actions)
+        return actions
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
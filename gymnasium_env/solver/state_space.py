@@ -0,0 +1,207 @@
+import numpy as np
+from collections import deque
+
+# Action ids of LabEnv: 0 Right, 1 Up, 2 Left, 3 Down, 4 Backtrack, 5+ Buttons
+BACKTRACK_ACTION = 4
+BUTTON_ACTION_OFFSET = 5
+
+
+def _open_bits(is_open, neighbors):
+    """
+    Bitsets of the open neighbours, indexed by room * num_masks + mask, from
+    is_open[room, mask, direction] and neighbors[room, direction] (-1 outside the grid).
+    """
+    if len(neighbors) <= 64:
+        # Every bitset fits a uint64
+        bits = np.where(neighbors >= 0, np.left_shift(np.uint64(1), np.maximum(neighbors, 0).astype(np.uint64)), np.uint64(0))
+        return np.where(is_open, bits[:, None, :], np.uint64(0)).sum(axis=-1, dtype=np.uint64).reshape(-1).tolist()
+    # Python ints as object array: bitsets wider than 64 rooms
+    bits = np.array([[1 << int(n) if n >= 0 else 0 for n in row] for row in neighbors], dtype=object)
+    return np.where(is_open, bits[:, None, :], 0).sum(axis=-1).reshape(-1).tolist()
+
+
+def _buttons_in_room(button_location_matrix, number_of_rooms):
+    # buttons_in_room[room]: tuple of the buttons located in `room`
+    buttons = [[] for _ in range(number_of_rooms)]
+    for room, btn_idx in zip(*np.nonzero(np.asarray(button_location_matrix) == 1)):
+        buttons[room].append(int(btn_idx))
+    return [tuple(b) for b in buttons]
+
+
+class LabStateSpace:
+    """
+    Integer-encoded (room, button_mask, last_room) state space of one lab.
+    The open-neighbour set of every (room, mask) pair is precomputed once as an integer
+    bitset, so expanding a state needs no door-row XORs and no np.where calls.
+    State id: (room * num_masks + mask) * (rooms + 1) + last_room, with last_room == rooms meaning none.
+    """
+
+    def __init__(self, start_room, goal_room, room_trans_matrix, door_state_matrix,
+                 button_location_matrix, button2door_behavior_matrix):
+        self.start_room = int(start_room)
+        self.goal_room = int(goal_room)
+        self.number_of_rooms = len(room_trans_matrix)
+        self.grid_size = int(np.sqrt(self.number_of_rooms))
+        self.number_of_buttons = len(button2door_behavior_matrix)
+        self.num_masks = 1 << self.number_of_buttons
+        self.num_last = self.number_of_rooms + 1
+        self.no_last = self.number_of_rooms
+        self.num_states = self.number_of_rooms * self.num_masks * self.num_last
+
+        # Doors of the grid neighbour slots for every button mask: open_slots[mask, room, direction]
+        # Imported here: gymnasium_env.envs imports the solver
+        from gymnasium_env.envs.lab_topology import LabTopology
+        neighbors = LabTopology.of(self.number_of_rooms).neighbors
+        rows, cols = np.arange(self.number_of_rooms)[:, None], np.maximum(neighbors, 0)
+        behaviors = np.asarray(button2door_behavior_matrix, dtype=np.uint8)[:, rows, cols]
+        open_slots = np.zeros((self.num_masks, self.number_of_rooms, 4), dtype=np.uint8)
+        open_slots[0] = np.asarray(door_state_matrix)[rows, cols]
+        for mask in range(1, self.num_masks):
+            low_bit = (mask & -mask).bit_length() - 1
+            open_slots[mask] = open_slots[mask ^ (1 << low_bit)] ^ behaviors[low_bit]
+        open_slots = (open_slots == 1) & (np.asarray(room_trans_matrix)[rows, cols] == 1) & (neighbors >= 0)
+
+        # open_bits[room * num_masks + mask]: bitset of rooms reachable with one move
+        self.open_bits = _open_bits(open_slots.transpose(1, 0, 2), neighbors)
+
+        self.buttons_in_room = _buttons_in_room(button_location_matrix, self.number_of_rooms)
+
+    @classmethod
+    def from_edges(cls, lab, door_edges=None):
+        """
+        State space of a sparse LabGenerator (per-edge arrays), built in O(masks * edges)
+        without any (rooms, rooms) matrix. `door_edges` overrides the lab's current doors.
+        """
+        space = cls.__new__(cls)
+        space.start_room = int(lab.start_room)
+        space.goal_room = int(lab.goal_room)
+        space.number_of_rooms = lab.number_of_rooms
+        space.grid_size = lab.grid_size
+        space.number_of_buttons = len(lab.button_edges)
+        space.num_masks = 1 << space.number_of_buttons
+        space.num_last = space.number_of_rooms + 1
+        space.no_last = space.number_of_rooms
+        space.num_states = space.number_of_rooms * space.num_masks * space.num_last
+
+        # Door states for every button mask: open_edges[mask, edge]
+        open_edges = np.zeros((space.num_masks, lab.number_of_edges), dtype=np.uint8)
+        open_edges[0] = lab.door_edges if door_edges is None else door_edges
+        for mask in range(1, space.num_masks):
+            low_bit = (mask & -mask).bit_length() - 1
+            open_edges[mask] = open_edges[mask ^ (1 << low_bit)] ^ lab.button_edges[low_bit]
+        open_edges &= np.asarray(lab.room_trans_edges, dtype=np.uint8)
+
+        edges = lab.neighbor_edges
+        is_open = (open_edges[:, np.maximum(edges, 0)] & (edges >= 0)).transpose(1, 0, 2).astype(bool)
+        space.open_bits = _open_bits(is_open, lab.neighbors)
+
+        space.buttons_in_room = _buttons_in_room(lab.button_location_matrix, space.number_of_rooms)
+        return space
+
+    @classmethod
+    def from_lab(cls, lab):
+        return cls(lab.start_room, lab.goal_room, lab.room_trans_matrix, lab.door_state_matrix,
+                   lab.button_location_matrix, lab.button2door_behavior_matrix)
+
+    @classmethod
+    def from_generator(cls, lab):
+        # State space of a LabGenerator, dense or sparse
+        if getattr(lab, "sparse", False):
+            return cls.from_edges(lab)
+        return cls.from_lab(lab)
+
+    @classmethod
+    def from_dataset(cls, dataset, idx):
+        return cls(dataset.get("start_room", idx), dataset.get("goal_room", idx), dataset.get("room_trans_matrix", idx),
+                   dataset.get("door_state_matrix", idx), dataset.get("button_location_matrix", idx),
+                   dataset.get("button2door_behavior_matrix", idx))
+
+    def encode(self, room, mask, last_room=-1):
+        last = self.no_last if last_room is None or last_room < 0 else last_room
+        return (room * self.num_masks + mask) * self.num_last + last
+
+    def decode(self, state):
+        # -> (room, mask, last_room) with last_room == -1 for none
+        room_mask, last = divmod(state, self.num_last)
+        room, mask = divmod(room_mask, self.num_masks)
+        return room, mask, (-1 if last == self.no_last else last)
+
+    def start_state(self):
+        return self.encode(self.start_room, 0, -1)
+
+    def move_action(self, room, neighbor):
+        # Direction action that moves from `room` to the grid neighbour `neighbor`
+        diff = neighbor - room
+        if diff == 1:
+            return 0
+        if diff == -self.grid_size:
+            return 1
+        if diff == -1:
+            return 2
+        return 3
+
+    def successors(self, state):
+        # Yields (action, next_state) for every legal action, in LabEnv semantics
+        num_last, num_masks = self.num_last, self.num_masks
+        room_mask, last = divmod(state, num_last)
+        room, mask = divmod(room_mask, num_masks)
+
+        bits = self.open_bits[room_mask]
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            neighbor = low.bit_length() - 1
+            yield self.move_action(room, neighbor), (neighbor * num_masks + mask) * num_last + room
+
+        if last != self.no_last:
+            yield BACKTRACK_ACTION, (last * num_masks + mask) * num_last + room
+
+        for btn_idx in self.buttons_in_room[room]:
+            yield BUTTON_ACTION_OFFSET + btn_idx, (room * num_masks + (mask ^ (1 << btn_idx))) * num_last + last
+
+    def is_solvable(self, start_state=None):
+        """
+        BFS over integer states with a flat visited array.
+        Returns True if the goal room is reachable considering walls, doors, buttons and backtracking.
+        """
+        num_last, num_masks, no_last, goal = self.num_last, self.num_masks, self.no_last, self.goal_room
+        open_bits, buttons_in_room = self.open_bits, self.buttons_in_room
+
+        state = self.start_state() if start_state is None else start_state
+        visited = bytearray(self.num_states)
+        visited[state] = 1
+        queue = deque([state])
+
+        while queue:
+            state = queue.popleft()
+            room_mask, last = divmod(state, num_last)
+            room, mask = divmod(room_mask, num_masks)
+
+            if room == goal:
+                return True
+
+            # 1. Buttons
+            for btn_idx in buttons_in_room[room]:
+                next_state = (room * num_masks + (mask ^ (1 << btn_idx))) * num_last + last
+                if not visited[next_state]:
+                    visited[next_state] = 1
+                    queue.append(next_state)
+
+            # 2. Backtracking
+            if last != no_last:
+                next_state = (last * num_masks + mask) * num_last + room
+                if not visited[next_state]:
+                    visited[next_state] = 1
+                    queue.append(next_state)
+
+            # 3. Moves through open doors
+            bits = open_bits[room_mask]
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                next_state = ((low.bit_length() - 1) * num_masks + mask) * num_last + room
+                if not visited[next_state]:
+                    visited[next_state] = 1
+                    queue.append(next_state)
+
+        return False
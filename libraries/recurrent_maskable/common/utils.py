@@ -14,6 +14,11 @@ def get_action_masks(env: GymEnv) -> np.ndarray:
     """
 
     if isinstance(env, VecEnv):
+        # Masks kept in one shared array by the envs themselves (see gymnasium_env.envs.action_masks),
+        # copied because the next step overwrites it
+        mask_array = getattr(env, "action_mask_array", None)
+        if mask_array is not None:
+            return mask_array.copy()
         return np.stack(env.env_method(EXPECTED_METHOD_NAME))
     else:
         return getattr(env, EXPECTED_METHOD_NAME)()
@@ -1,7 +1,5 @@
 import gymnasium as gym
 import numpy as np
-import collections
-import heapq
 import os
 import sys
 import torch as th
@@ -13,6 +11,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../libraries/recurrent_maskable')))
 
 from gymnasium_env.envs.lab_env_cnn import LabEnvCNN
+from gymnasium_env.envs.demo_dataset import build_demos, demo_seeds, demos_path
 from torch import nn
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 from libraries.recurrent_maskable.ppo_mask_recurrent import RecurrentMaskablePPO
@@ -75,112 +74,16 @@ class WarmUpCallback(BaseCallback):
         if not policy.share_features_extractor:
             for param in policy.pi_features_extractor.parameters():
                 param.requires_grad = requires_grad
-def a_star_solve(unwrapped_env):
-    lab = unwrapped_env.lab
-     
-    h_dist = np.full(lab.number_of_rooms, np.inf)
-    h_dist[lab.goal_room] = 0
-    q = collections.deque([lab.goal_room])
-    while q:
-        curr = q.popleft()
-        for neighbor in range(lab.number_of_rooms):
-            if lab.room_trans_matrix[curr, neighbor] == 1 and h_dist[neighbor] == np.inf:
-                h_dist[neighbor] = h_dist[curr] + 1
-                q.append(neighbor)
-    
-    start_room = lab.start_room
-    start_state = (start_room, 0, -1)
-    
-    pq = [(h_dist[start_room], 0, 0, start_state, [])]
-    visited = {start_state: 0} 
-    idx = 1
-    
-    while pq:
-        f, _, g, state, path = heapq.heappop(pq)
-        curr_room, curr_mask, last_room = state
-        
-        if curr_room == lab.goal_room:
-            return path
-            
-        curr_r, curr_c = lab.index_to_coord(curr_room)
-        
-        curr_doors_row = lab.door_state_matrix[curr_room].copy()
-        for btn_idx in range(lab.number_of_buttons):
-            if (curr_mask >> btn_idx) & 1:
-                curr_doors_row = np.bitwise_xor(curr_doors_row, lab.button2door_behavior_matrix[btn_idx][curr_room])
-                
-        deltas = [(0, 1), (-1, 0), (0, -1), (1, 0)] # Right, Up, Left, Down
-        for action, (dr, dc) in enumerate(deltas):
-            nr, nc = curr_r + dr, curr_c + dc
-            if 0 <= nr < lab.grid_size and 0 <= nc < lab.grid_size:
-                neighbor = lab.coord_to_index(nr, nc)
-                if lab.room_trans_matrix[curr_room, neighbor] == 1 and curr_doors_row[neighbor] == 1:
-                    next_state = (neighbor, curr_mask, curr_room)
-                    next_g = g + 1
-                    if next_state not in visited or next_g < visited[next_state]:
-                        visited[next_state] = next_g
-                        heapq.heappush(pq, (next_g + h_dist[neighbor], idx, next_g, next_state, path + [action]))
-                        idx += 1
-                        
-        if last_room != -1:
-            next_state = (last_room, curr_mask, curr_room)
-            next_g = g + 1
-            if next_state not in visited or next_g < visited[next_state]:
-                visited[next_state] = next_g
-                heapq.heappush(pq, (next_g + h_dist[last_room], idx, next_g, next_state, path + [4]))
-                idx += 1
-                
-        available_buttons = np.where(lab.button_location_matrix[curr_room] == 1)[0]
-        for btn_idx in available_buttons:
-            next_mask = curr_mask ^ (1 << btn_idx)
-            next_state = (curr_room, next_mask, last_room)
-            next_g = g + 1
-            if next_state not in visited or next_g < visited[next_state]:
-                visited[next_state] = next_g
-                heapq.heappush(pq, (next_g + h_dist[curr_room], idx, next_g, next_state, path + [5 + btn_idx]))
-                idx += 1
-                
-    return []
-
-def generate_expert_demonstrations_dict(env, num_episodes=50):
-    trajectories = []
-    
-    for i in range(num_episodes):
-        obs, _ = env.reset()
-        unwrapped_env = env.unwrapped
-        
-        opt_actions = a_star_solve(unwrapped_env)
-        
-        if not opt_actions:
-            print(f"Warning: Episode {i} is not solvable. Skipping...")
-            continue
-            
-        episode_obs = [obs]
-        episode_acts = []
-        
-        for action in opt_actions:
-            obs, reward, terminated, truncated, info = env.step(action)
-            episode_obs.append(obs)
-            episode_acts.append(action)
-            if terminated or truncated:
-                break
-                
-        trajectories.append({
-            'obs': episode_obs,
-            'acts': episode_acts
-        })
-        if (i+1) % 10 == 0:
-            print(f"Generated {i+1}/{num_episodes} trajectories...")
-            
-    return trajectories
 
 def pretrain_bc():
     print("Initializing Environment...")
     env = LabEnvCNN(number_of_rooms=9, valid_seeds="train")
     
     print("Generating expert demonstrations utilizing A*...")
-    trajectories = generate_expert_demonstrations_dict(env, num_episodes=25000)
-    print(f"Collected {len(trajectories)} trajectories.")
+    # Solved and replayed in parallel into memory-mapped columns, reruns only generate missing seeds
+    demos = build_demos(demos_path(9, cnn=True), demo_seeds(25000), number_of_rooms=9,
+                        env_kwargs={"valid_seeds": "train"}, cnn=True)
+    print(f"Collected {len(demos)} trajectories.")
     
     print("Initializing RecurrentMaskablePPO Model...")
     model = RecurrentMaskablePPO(
@@ -203,18 +106,17 @@ def pretrain_bc():
         total_loss = 0.0
         n_batches = 0
         
-        for traj in trajectories:
-            obs_list = traj['obs'][:-1] 
-            acts_list = traj['acts']
+        for episode in range(len(demos)):
+            obs_array, acts_array, _ = demos.episode(episode)
             
-            if len(acts_list) == 0:
+            if len(acts_array) == 0:
                 continue
                 
-            obs_tensor = th.tensor(np.stack(obs_list), device=model.device)
+            obs_tensor = th.tensor(np.asarray(obs_array, dtype=env.observation_space.dtype), device=model.device)
             
-            acts_tensor = th.tensor(acts_list, device=model.device)
+            acts_tensor = th.tensor(np.asarray(acts_array, dtype=np.int64), device=model.device)
             
-            episode_starts = th.zeros(len(acts_list), dtype=th.float32, device=model.device)
+            episode_starts = th.zeros(len(acts_array), dtype=th.float32, device=model.device)
             episode_starts[0] = 1.0
             
             lstm = model.policy.lstm_actor
@@ -1,109 +1,30 @@
 import sys
 import os
 import numpy as np
-import heapq
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from gymnasium_env.envs.lab_env import LabEnv
+from gymnasium_env.solver import env_state, solve
+from gymnasium_env.solver.solution_cache import SolutionCache
 
 from sb3_contrib import MaskablePPO
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../libraries/recurrent_maskable')))
 from libraries.recurrent_maskable.ppo_mask_recurrent import RecurrentMaskablePPO
 
-def get_neighbors(state, env):
-    agent_idx, door_state_tuple, last_idx = state
-    neighbors = []
-    door_states = np.array(door_state_tuple)
-    
-    agent_r, agent_c = env.lab.index_to_coord(agent_idx)
-    deltas = [(0, 1), (-1, 0), (0, -1), (1, 0)] 
-    
-    # 1. Normal Moves (0-3)
-    for action_idx, (dr, dc) in enumerate(deltas):
-        new_r, new_c = agent_r + dr, agent_c + dc
-        if 0 <= new_r < env.grid_size and 0 <= new_c < env.grid_size:
-            target_idx = env.lab.coord_to_index(new_r, new_c)
-            # Normal move requires open door
-            if door_states[agent_idx, target_idx] == 1:
-                neighbors.append((action_idx, (target_idx, door_state_tuple, agent_idx)))
-                
-    # 2. Backtrack (4)
-    if last_idx != -1:
-        # Backtracking ignores door state
-        neighbors.append((4, (last_idx, door_state_tuple, agent_idx)))
-
-    # 3. Buttons (5+)
-    buttons_here = np.where(env.lab.button_location_matrix[agent_idx] == 1)[0]
-    for btn in buttons_here:
-        action_idx = 5 + btn
-        behavior = env.lab.button2door_behavior_matrix[btn]
-        new_states = np.logical_xor(door_states, behavior).astype(int)
-        new_states = new_states * env.lab.room_trans_matrix
-        new_tuple = tuple(tuple(row) for row in new_states)
-        # Button press does not change last_idx
-        neighbors.append((action_idx, (agent_idx, new_tuple, last_idx)))
-        
-    return neighbors
-
-def heuristic(state, env):
-    agent_idx, _, _ = state
-    agent_r, agent_c = env.lab.index_to_coord(agent_idx)
-    goal_r, goal_c = env.lab.index_to_coord(env.lab.goal_room)
-    return abs(agent_r - goal_r) + abs(agent_c - goal_c)
-
-def a_star_search(env):
-    agent_r, agent_c = env.agent_location
-    start_idx = env.lab.coord_to_index(agent_r, agent_c)
-    # env.last_pos is initialized in reset, so we should match that
-    last_r, last_c = env.last_pos
-    if last_r == -1:
-        start_last_idx = -1
-    else:
-        start_last_idx = env.lab.coord_to_index(last_r, last_c)
-
-    start_state = (start_idx, tuple(tuple(row) for row in env.lab.door_state_matrix), start_last_idx)
-    goal_idx = env.lab.goal_room
-    
-    frontier = []
-    heapq.heappush(frontier, (0, 0, start_state))
-    came_from = {start_state: None}
-    cost_so_far = {start_state: 0}
-    action_to_reach = {}
-    counter = 1
-    
-    found_goal_state = None
-    while frontier:
-        _, _, current = heapq.heappop(frontier)
-        
-        if current[0] == goal_idx:
-            found_goal_state = current
-            break
-            
-        for action, next_state in get_neighbors(current, env):
-            new_cost = cost_so_far[current] + 1 
-            if next_state not in cost_so_far or new_cost < cost_so_far[next_state]:
-                cost_so_far[next_state] = new_cost
-                priority = new_cost + heuristic(next_state, env)
-                heapq.heappush(frontier, (priority, counter, next_state))
-                counter += 1
-                came_from[next_state] = current
-                action_to_reach[next_state] = action
-                
-    if found_goal_state is None:
-        return []
-        
-    path = []
-    current = found_goal_state
-    while current != start_state:
-        prev = came_from[current]
-        action = action_to_reach[current]
-        path.append(action)
-        current = prev
-    path.reverse()
-    return path
-
-def evaluate_agent(agent_name, env, seeds_to_run, model=None, is_recurrent=False):
+def a_star_search(env, cache=None):
+    """
+    Optimal plan from the env's current state. States are packed into one integer (agent room,
+    button mask, last room, see LabStateSpace) and expanded by lookups into the per-(room, mask)
+    open-door bitsets, so the doors are never copied or hashed.
+    With a SolutionCache, plans from the start of an episode are read from / written to it.
+    """
+    if cache is not None:
+        return cache.solve_env(env) or []
+    space, start_state = env_state(env)
+    return solve(space, start_state=start_state) or []
+
+def evaluate_agent(agent_name, env, seeds_to_run, model=None, is_recurrent=False, cache=None):
     rewards = []
     lengths = []
     successes = 0
@@ -119,7 +40,7 @@ def evaluate_agent(agent_name, env, seeds_to_run, model=None, is_recurrent=False
             episode_starts = np.ones((1,), dtype=bool)
 
         if agent_name == "A*":
-            path = a_star_search(env)
+            path = a_star_search(env, cache)
             if len(path) == 0 and env.lab.coord_to_index(*env.agent_location) == env.lab.goal_room:
                  done = True
             
@@ -178,7 +99,9 @@ def main():
     print(f"{'Agent':<20} | {'Success%':<10} | {'Mean Len':<10} | {'Mean Reward'}")
     print("-" * 65)
 
-    mean_rew_astar, std_rew_astar, mean_len_astar, succ_astar = evaluate_agent("A*", env, seeds_to_run)
+    cache = SolutionCache()
+    mean_rew_astar, std_rew_astar, mean_len_astar, succ_astar = evaluate_agent("A*", env, seeds_to_run, cache=cache)
+    cache.close()
     print(f"{'A* Search':<20} | {succ_astar:<10.1f} | {mean_len_astar:<10.2f} | {mean_rew_astar:.2f} +/- {std_rew_astar:.2f}")
 
     # PPO Masked
@@ -1,6 +1,6 @@
 import gymnasium as gym
 from stable_baselines3.common.callbacks import BaseCallback
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env import DummyVecEnv, VecMonitor
 import sys
 import os
 import optuna
@@ -8,6 +8,9 @@ import optuna
 # Add parent directory for env import
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from gymnasium_env.envs.lab_env import LabEnv
+from gymnasium_env.envs.lab_vec_env import LabVecEnv
+from gymnasium_env.envs.action_masks import share_action_masks
+from gymnasium_env.envs.shared_vec_env import SharedMemoryVecEnv
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../libraries/recurrent_maskable')))
 from libraries.recurrent_maskable.ppo_mask_recurrent import RecurrentMaskablePPO
 from libraries.recurrent_maskable.common.evaluation import evaluate_policy
@@ -76,6 +79,8 @@ def objective(trial):
     kwargs = sample_ppo_params(trial)
     num_cpu = 8
     env = DummyVecEnv([make_env(i, rooms=9, seeds="train") for i in range(num_cpu)])
+    # Masks are read from one shared array instead of an action_masks() call per env and step
+    share_action_masks(env)
     eval_env = LabEnv(number_of_rooms=9, valid_seeds="eval")
 
     model = RecurrentMaskablePPO(
@@ -160,7 +165,7 @@ def make_env(rank, seed=0, rooms=9, seeds="train", max_rooms=None):
 def train_vec():
     print("Initializing Vector Environment...")
     num_cpu = 16 
-    env = DummyVecEnv([make_env(i) for i in range(num_cpu)])
+    env = LabVecEnv(num_envs=num_cpu, number_of_rooms=9, valid_seeds="train", seed=0)
     
     print("Observation Space:", env.observation_space)
     print("Action Space:", env.action_space)
@@ -184,10 +189,39 @@ def train_vec():
     mean_reward, _ = evaluate_policy(model, eval_env, n_eval_episodes=10, return_episode_rewards=True, deterministic=True)
     print("Eval reward: ", mean_reward)
 
+def train_shared(num_workers=None):
+    print("Initializing Shared Memory Vector Environment...")
+    num_envs = 64
+    # Envs are split into contiguous slices, one worker process per core by default
+    env = VecMonitor(SharedMemoryVecEnv([make_env(i, rooms=9, seeds="train") for i in range(num_envs)], num_workers=num_workers))
+    
+    print("Observation Space:", env.observation_space)
+    print("Action Space:", env.action_space)
+
+    print("Initializing PPO Model...")
+    model = RecurrentMaskablePPO(
+        "MultiInputLstmPolicy", 
+        env,
+        **para,
+        verbose=0,
+        tensorboard_log="tmp/logs/ppo_mr_agent_shared/"
+    ) 
+    print("Starting Shared Memory Vector Training...")
+    model.learn(total_timesteps=1000000, progress_bar=True)
+    
+    print("Saving Shared Memory Vector Model...")
+    model.save("ppo_mr_shared_env")
+    print("Shared Memory Vector Training finished and model saved.")
+    env.close()
+    
+    eval_env = LabEnv(number_of_rooms=9, valid_seeds="eval")
+    mean_reward, _ = evaluate_policy(model, eval_env, n_eval_episodes=10, return_episode_rewards=True, deterministic=True)
+    print("Eval reward: ", mean_reward)
+
 def train_curriculum():
     print("Initializing Curriculum Vector Environment... (Max Rooms: 9)")
     num_cpu = 16
-    env = DummyVecEnv([make_env(i, rooms=4, max_rooms=9) for i in range(num_cpu)])
+    env = LabVecEnv(num_envs=num_cpu, number_of_rooms=4, valid_seeds="train", max_rooms=9, seed=0)
     
     print("Observation Space:", env.observation_space)
     print("Action Space:", env.action_space)
@@ -201,6 +235,7 @@ def train_curriculum():
         tensorboard_log="tmp/logs/ppo_mr_curriculum_vec/"
     )
     
+    # "difficulty" optionally filters the stage's labs, e.g. {"solution_length": (None, 12)} (needs a dataset with difficulty columns)
     stages = [
         {"rooms": 4, "timesteps": 220000},
         {"rooms": 9, "timesteps": 380000},
@@ -212,6 +247,7 @@ def train_curriculum():
         timesteps = stage["timesteps"]
         print(f"--- Starting Curriculum Stage: {num_rooms} Rooms for {timesteps} steps ---")
         env.env_method("set_curriculum_stage", num_rooms)
+        env.env_method("set_difficulty", stage.get("difficulty"), stage.get("difficulty_weights"))
         model.learn(total_timesteps=timesteps, progress_bar=True, reset_num_timesteps=False)
     
     print("Saving Curriculum Model...")
@@ -229,6 +265,8 @@ if __name__ == "__main__":
     parser.add_argument("--eval", action="store_true", help="Run evaluation")
     parser.add_argument("--train_vec", action="store_true", help="Run vectorized training")
     parser.add_argument("--curriculum", action="store_true", help="Run curriculum training")
+    parser.add_argument("--shared", action="store_true", help="Run vectorized training with shared memory worker processes")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --shared (default: all cores)")
     args = parser.parse_args()
 
     if args.tune:
@@ -239,5 +277,7 @@ if __name__ == "__main__":
         train_vec()
     elif args.curriculum:
         train_curriculum()
+    elif args.shared:
+        train_shared(args.workers)
     else:
         train()
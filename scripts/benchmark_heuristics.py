@@ -0,0 +1,56 @@
+import sys
+import os
+import time
+import numpy as np
+
+# Add root project folder to python path to import the env modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from gymnasium_env.envs.lab_generator import LabGenerator
+from gymnasium_env.solver.heuristics import HEURISTICS
+from gymnasium_env.solver.search import a_star
+from gymnasium_env.solver.state_space import LabStateSpace
+
+
+def benchmark(number_of_rooms, number_of_buttons, seeds, heuristics):
+    """
+    A* with every heuristic on the labs of `seeds`: mean states expanded, heuristic build time and
+    search time per lab. All heuristics are admissible, so the plan lengths must agree.
+    """
+    lab = LabGenerator(number_of_rooms=number_of_rooms, number_of_buttons=number_of_buttons,
+                       sparse=number_of_rooms > 100)
+    results = {name: {"expanded": [], "build": [], "search": []} for name in heuristics}
+    for seed in seeds:
+        lab.generate_lab(seed=int(seed))
+        space = LabStateSpace.from_generator(lab)
+        lengths = set()
+        for name in heuristics:
+            start = time.perf_counter()
+            heuristic = HEURISTICS[name](space)
+            built = time.perf_counter()
+            result = a_star(space, heuristic=heuristic)
+            done = time.perf_counter()
+            results[name]["expanded"].append(result.expanded)
+            results[name]["build"].append(built - start)
+            results[name]["search"].append(done - built)
+            lengths.add(None if result.actions is None else len(result.actions))
+        if len(lengths) > 1:
+            raise RuntimeError(f"Plan lengths differ on seed {seed}: {lengths}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", nargs="+", default=["9x4", "16x4", "36x6", "64x8"],
+                        help="Lab sizes as ROOMSxBUTTONS")
+    parser.add_argument("--labs", type=int, default=50, help="Labs per configuration")
+    parser.add_argument("--heuristics", nargs="+", default=["none", "manhattan", "room", "pdb"], choices=list(HEURISTICS))
+    args = parser.parse_args()
+
+    print(f"{'lab':>8} {'heuristic':>10} {'expanded':>10} {'build ms':>10} {'search ms':>10} {'total ms':>10}")
+    for config in args.configs:
+        rooms, buttons = (int(value) for value in config.split("x"))
+        results = benchmark(rooms, buttons, range(args.labs), args.heuristics)
+        for name, result in results.items():
+            build, search = 1000 * np.mean(result["build"]), 1000 * np.mean(result["search"])
+            print(f"{config:>8} {name:>10} {np.mean(result['expanded']):>10.1f} {build:>10.2f} {search:>10.2f} {build + search:>10.2f}")
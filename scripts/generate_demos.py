@@ -0,0 +1,24 @@
+import sys
+import os
+import multiprocessing as mp
+
+# Add root project folder to python path to import the env modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from gymnasium_env.envs.demo_dataset import build_demos, demo_seeds, demos_path
+
+if __name__ == "__main__":
+    mp.freeze_support() # Recommended for Windows multi-processing compatibility
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=9, help="Room count of the labs")
+    parser.add_argument("--episodes", type=int, default=100000, help="Number of training seeds to demonstrate (tops up existing demos)")
+    parser.add_argument("--cnn", action="store_true", help="Record LabEnvCNN observations")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Seeds per chunk file")
+    parser.add_argument("--output", default=None, help="Output directory (default: datasets/demos_{rooms})")
+    args = parser.parse_args()
+
+    output_dir = args.output or demos_path(args.rooms, cnn=args.cnn)
+    demos = build_demos(output_dir, demo_seeds(args.episodes), number_of_rooms=args.rooms, env_kwargs={"valid_seeds": "train"},
+                        cnn=args.cnn, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"[Demos] {len(demos)} episodes, {demos.num_steps} steps -> {output_dir}")
@@ -14,65 +14,124 @@ except ImportError:
 # Add root project folder to python path to import the Generator module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from gymnasium_env.envs.lab_generator import LabGenerator
+from gymnasium_env.envs.maze_dataset import MazeDataset
+from gymnasium_env.envs.seed_sampler import TRAIN_SEEDS, EVAL_SEEDS
+from gymnasium_env.solver.oracle import compute_oracle_batch
+from gymnasium_env.solver.difficulty import compute_difficulty_batch
 
-def generate_single_maze(args):
-    seed, num_rooms = args
-    # Construct Lab
+def generate_maze_batch(args):
+    seeds, num_rooms = args
+    # Construct Lab and generate the whole chunk with the vectorized batch generator
     generator = LabGenerator(number_of_rooms=num_rooms)
-    generator.generate_lab(seed=seed)
+    batch = generator.generate_batch(seeds=seeds)
     
-    # Return layout properties
-    return {
-        "seed": seed,
-        "start_room": generator.start_room,
-        "goal_room": generator.goal_room,
-        "room_trans_matrix": generator.room_trans_matrix,
-        "door_state_matrix": generator.door_state_matrix,
-        "button_location_matrix": generator.button_location_matrix,
-        "button2door_behavior_matrix": generator.button2door_behavior_matrix
-    }
-
-def build_dataset(num_rooms, seeds, output_file):
-    print(f"\n[Size {num_rooms}] Building dataset. Total seeds: {len(seeds)}")
-    args = [(seed, num_rooms) for seed in seeds]
-    
-    # Map generation asynchronously
-    with mp.Pool(mp.cpu_count()) as pool:
-        # chunksize of 100 handles IPC overhead well
-        results = list(tqdm(pool.imap(generate_single_maze, args, chunksize=100), total=len(args)))
-        
-    print(f"[Size {num_rooms}] Stacking results into continuous arrays...")
+    # Exact distance-to-goal and optimal actions for every state (backward from the goal)
+    batch["oracle_distance"], batch["oracle_actions"] = compute_oracle_batch(
+        batch["goal_room"], batch["room_trans_matrix"], batch["door_state_matrix"],
+        batch["button_location_matrix"], batch["button2door_behavior_matrix"],
+    )
     
-    # Stack dictionaries
-    stacked = {
-        "seeds": np.array([r["seed"] for r in results]),
-        "start_room": np.array([r["start_room"] for r in results]),
-        "goal_room": np.array([r["goal_room"] for r in results]),
-        "room_trans_matrix": np.array([r["room_trans_matrix"] for r in results]),
-        "door_state_matrix": np.array([r["door_state_matrix"] for r in results]),
-        "button_location_matrix": np.array([r["button_location_matrix"] for r in results]),
-        "button2door_behavior_matrix": np.array([r["button2door_behavior_matrix"] for r in results]),
-    }
+    # Difficulty features for curriculum sampling (bucketed into the difficulty index)
+    batch.update(compute_difficulty_batch(
+        batch["start_room"], batch["goal_room"], batch["room_trans_matrix"], batch["door_state_matrix"],
+        batch["button_location_matrix"], batch["button2door_behavior_matrix"],
+        distance=batch["oracle_distance"], optimal_actions=batch["oracle_actions"],
+    ))
     
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    np.savez_compressed(output_file, **stacked)
+    # Symmetry class of every lab (grid rotations/reflections and button order), used for deduplication
+    _, _, batch["canonical_hash"] = generator.canonical_batch(
+        batch["start_room"], batch["goal_room"], batch["room_trans_matrix"], batch["door_state_matrix"],
+        batch["button_location_matrix"], batch["button2door_behavior_matrix"],
+    )
+    return batch
+
+def shard_name(shard_id):
+    return f"shard_{shard_id:05d}"
+
+def build_shard(num_rooms, seeds, shard_dir, pool, chunk_size):
+    # Streams chunk results straight into preallocated shard arrays (no list of all batches)
+    args = [(seeds[i:i + chunk_size], num_rooms) for i in range(0, len(seeds), chunk_size)]
+    arrays = None
+    row = 0
+    for batch in tqdm(pool.imap(generate_maze_batch, args), total=len(args), leave=False):
+        if arrays is None:
+            arrays = {k: np.empty((len(seeds),) + v.shape[1:], dtype=v.dtype) for k, v in batch.items()}
+        n = len(batch["seeds"])
+        for k, v in batch.items():
+            arrays[k][row:row + n] = v
+        row += n
+    MazeDataset.write(shard_dir, arrays, num_rooms)
+
+def build_dataset(num_rooms, seeds, output_dir, shard_size=100000, chunk_size=2000):
+    """
+    Builds the dataset for `num_rooms` as shards of `shard_size` seeds under `output_dir`.
+    Peak memory is a single shard. Shards that are already complete (header.json written) are
+    skipped, so an interrupted build resumes where it stopped; the manifest.json tying the
+    shards together is written once every shard exists.
+    """
+    seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+    shard_seeds = [seeds[i:i + shard_size] for i in range(0, len(seeds), shard_size)]
+    names = [shard_name(i) for i in range(len(shard_seeds))]
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"\n[Size {num_rooms}] Building dataset. Total seeds: {len(seeds)} in {len(names)} shards")
+
+    with mp.Pool(mp.cpu_count()) as pool:
+        for name, chunk in zip(names, shard_seeds):
+            shard_dir = os.path.join(output_dir, name)
+            header = MazeDataset.read_shard_header(shard_dir)
+            # Shards without seed runs record their first seed (headers of format version 1 always have runs)
+            first_seed = header and header.get("first_seed", header["seed_runs"] and header["seed_runs"][0][0])
+            if header is not None and header["count"] == len(chunk) and first_seed == chunk[0]:
+                print(f"[Size {num_rooms}] {name} already built, skipping")
+                continue
+            print(f"[Size {num_rooms}] Building {name} (seeds {chunk[0]}..{chunk[-1]})")
+            build_shard(num_rooms, chunk, shard_dir, pool, chunk_size)
+
+    # A single file layout left from an older build would shadow the manifest
+    if os.path.exists(os.path.join(output_dir, "header.json")):
+        os.remove(os.path.join(output_dir, "header.json"))
+    MazeDataset.write_manifest(output_dir, names, num_rooms)
     
-    mb_size = os.path.getsize(output_file) / (1024 * 1024)
-    print(f"[Size {num_rooms}] Saved seamlessly -> {output_file} ({mb_size:.2f} MB)\n")
+    # Dedup pass: one representative seed per symmetry class, the difficulty index only covers those
+    unique, total = MazeDataset.write_unique_seeds(output_dir)
+    print(f"[Size {num_rooms}] {unique} unique labs out of {total} ({total - unique} symmetric duplicates)")
+    MazeDataset.write_difficulty_index(output_dir)
+
+    mb_size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(output_dir) for f in files) / (1024 * 1024)
+    print(f"[Size {num_rooms}] Saved seamlessly -> {output_dir} ({mb_size:.2f} MB)\n")
+
+def convert_legacy_datasets(dataset_dir):
+    # Converts old mazes_{n}.npz files into the memory-mapped format
+    for name in sorted(os.listdir(dataset_dir)):
+        if name.startswith("mazes_") and name.endswith(".npz"):
+            npz_path = os.path.join(dataset_dir, name)
+            print(f"Converting {npz_path}...")
+            print(f"  -> {MazeDataset.convert_npz(npz_path)}")
 
 if __name__ == "__main__":
     mp.freeze_support() # Recommended for Windows multi-processing compatibility
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--convert", action="store_true", help="Convert legacy mazes_{n}.npz datasets instead of generating")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[4, 9], help="Room counts to build datasets for")
+    parser.add_argument("--train-seeds", type=int, default=len(TRAIN_SEEDS), help="Number of training seeds (from 0)")
+    parser.add_argument("--shard-size", type=int, default=100000, help="Seeds per shard")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Seeds per worker task")
+    args = parser.parse_args()
 
-    train_seeds = list(range(0, 1000000))
-    test_seeds = list(range(10000000, 10001000))
-    all_seeds = train_seeds + test_seeds
+    all_seeds = np.concatenate([
+        np.arange(TRAIN_SEEDS.start, TRAIN_SEEDS.start + args.train_seeds, dtype=np.int64),
+        np.arange(EVAL_SEEDS.start, EVAL_SEEDS.stop, dtype=np.int64),
+    ])
     
     base_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_dir = os.path.abspath(os.path.join(base_dir, "..", "datasets"))
     
-    # Process grids of 2x2 and 3x3 rooms respectively
-    target_room_sizes = [4, 9] 
+    if args.convert:
+        convert_legacy_datasets(dataset_dir)
+        sys.exit(0)
     
-    for rooms in target_room_sizes:
-        output_file = os.path.join(dataset_dir, f"mazes_{rooms}.npz")
-        build_dataset(rooms, all_seeds, output_file)
+    # Grids of 2x2 and 3x3 rooms by default
+    for rooms in args.rooms:
+        output_dir = os.path.join(dataset_dir, f"mazes_{rooms}")
+        build_dataset(rooms, all_seeds, output_dir, shard_size=args.shard_size, chunk_size=args.chunk_size)